@@ -0,0 +1,393 @@
+"""Offline benchmark for the wallet watcher and its commands.
+
+Every scenario runs the real watcher and command handlers against a FakeNode
+in its own process and a fake Discord client, with a given number of watched
+addresses, and measures blocks/sec and alerts/sec while catching up, alert
+latency from mining to Discord while following new blocks, RPCs per block and
+the latency and RPC cost of common commands. Nothing touches the network, and
+reports are JSON so runs can be compared:
+
+    python bench.py --addresses 10,1000,100000 --output before.json
+    python bench.py --addresses 10,1000,100000 --compare before.json
+
+Recorded mainnet blocks can be replayed instead of synthetic ones:
+
+    python bench.py record --rpc https://mainnet.infura.io/v3/KEY --from-block 19000000 --count 50 --output blocks.json
+    python bench.py --replay blocks.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+import fakenode
+
+# Watched addresses per user, the old per-user cap
+ADDRESSES_PER_USER = 10
+# Watched addresses that take part in the generated transactions, so the alert
+# volume stays comparable however many addresses are watched
+ACTIVE_ADDRESSES = 200
+UNWATCHED_ADDRESSES = 1000
+# Commands benchmarked for the first user, with their arguments
+COMMANDS = [
+    ('list', 'list_addresses', ()),
+    ('balance', 'check_balance', ('wallet0',)),
+    ('tokenbalance', 'check_token_balance', ('wallet0', 'token0')),
+    ('portfolio', 'get_portfolio', ()),
+    ('blocktransactions', 'get_block_transactions', (1,)),
+]
+# Headline of a transaction or token transfer alert, capturing its block
+ALERT_BLOCK = re.compile(r'found for address .* in block (\d+)')
+# Report fields compared between runs, and whether higher is better
+COMPARED_FIELDS = {
+    'blocks_per_sec': True,
+    'alerts_per_sec': True,
+    'alert_latency_p50_ms': False,
+    'alert_latency_p99_ms': False,
+    'rpcs_per_block': False,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_node(port, config, ready, start_live, mined):
+    """Node process: pre-mine the catch-up blocks, serve, then mine live blocks when told to."""
+    async def serve():
+        node = fakenode.FakeNode(
+            txs_per_block=config['txs'], transfers_per_block=config['transfers'],
+            addresses=config['pool'], seed=config['seed'], latency=config['latency'],
+            error_rate=config['error_rate'], replay=config['replay']
+        )
+        for _ in range(config['blocks'] - 1):
+            node.mine_block()
+        await node.start('127.0.0.1', port)
+        ready.put((node.head, list(node.tokens)))
+        await asyncio.get_running_loop().run_in_executor(None, start_live.wait)
+        for _ in range(config['live_blocks']):
+            await asyncio.sleep(config['block_time'])
+            await node.publish_head(node.mine_block())
+        mined.put(node.mined_at)
+        await asyncio.Event().wait()
+    asyncio.run(serve())
+
+
+class FakeDestination:
+    def __init__(self, discord_client, key):
+        self.discord_client = discord_client
+        self.key = key
+
+    async def send(self, content=None, **kwargs):
+        await asyncio.sleep(self.discord_client.latency)
+        self.discord_client.sent.append((time.time(), self.key, content))
+
+
+class FakeDiscord:
+    """Stands in for the Discord API: records every message after a simulated round trip."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.sent = []
+
+    def get_user(self, user_id):
+        return FakeDestination(self, ('user', user_id))
+
+    def get_channel(self, channel_id):
+        return FakeDestination(self, ('channel', channel_id))
+
+
+class FakeContext:
+    class author:
+        id = 1
+        name = 'bench'
+
+    guild = None
+
+    async def send(self, content=None, **kwargs):
+        return None
+
+
+def install_fakes(w, discord_client):
+    w.bot.get_user = discord_client.get_user
+    w.bot.get_channel = discord_client.get_channel
+    w.bot.is_ready = lambda: True
+    w.alert_routes.clear()
+    w.alert_routes[1] = 1
+
+
+def reset_state(w, addresses, tokens):
+    """Replace the bot's users, caches, cursor and metrics with a fresh scenario."""
+    w.user_addresses.clear()
+    w.tracked_addresses.clear()
+    w.token_addresses.clear()
+    for index, address in enumerate(addresses):
+        user_id = index // ADDRESSES_PER_USER + 1
+        alias = f'wallet{index % ADDRESSES_PER_USER}'
+        w.user_addresses.setdefault(user_id, {})[alias] = address
+        w.tracked_addresses.setdefault(user_id, {})[alias] = address
+    w.token_addresses[1] = {f'token{i}': token for i, token in enumerate(tokens)}
+    w.rebuild_address_index()
+    # Every user is in the one routed guild, so channel routing fans out as in a busy server
+    w.member_guilds.clear()
+    for user_id in w.user_addresses:
+        w.member_guilds[user_id] = {1}
+    for cache in w.caches + [w.pending_seen]:
+        cache.entries.clear()
+    w.metrics.drain()
+    w.metrics.gauges.clear()
+    w.notifier = w.Notifier()
+    w.new_heads_subscribed = False
+    if os.path.exists(w.WATCHER_STATE_FILE):
+        os.remove(w.WATCHER_STATE_FILE)
+    w.save_cursor(0, None)
+
+
+async def wait_until(predicate, timeout, interval=0.01):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError('Benchmark scenario did not finish in time')
+        await asyncio.sleep(interval)
+
+
+def rpc_count(w):
+    return sum(w.metrics.series('rpc_requests_total').values())
+
+
+async def run_scenario(w, args, address_count, replay):
+    rng = random.Random(args.seed)
+    addresses = ['0x%040x' % rng.getrandbits(160) for _ in range(address_count)]
+    pool = addresses[:ACTIVE_ADDRESSES] + ['0x%040x' % rng.getrandbits(160) for _ in range(UNWATCHED_ADDRESSES)]
+    config = {
+        'txs': args.txs, 'transfers': args.transfers, 'pool': pool, 'seed': args.seed,
+        'latency': args.rpc_latency, 'error_rate': args.error_rate, 'replay': replay,
+        'blocks': args.blocks, 'live_blocks': args.live_blocks, 'block_time': args.block_time,
+    }
+
+    port = free_port()
+    context = multiprocessing.get_context('spawn')
+    ready, mined, start_live = context.Queue(), context.Queue(), context.Event()
+    node = context.Process(target=run_node, args=(port, config, ready, start_live, mined), daemon=True)
+    node.start()
+    tasks = []
+    try:
+        head, tokens = await asyncio.get_running_loop().run_in_executor(None, ready.get)
+        first_block = head - args.blocks + 1
+        w.rpc_pool.endpoints = w.parse_endpoints(f'http://127.0.0.1:{port}')
+        w.infura_ws_url = f'ws://127.0.0.1:{port}'
+        os.environ['RPC_URLS'] = f'http://127.0.0.1:{port}'
+        reset_state(w, addresses, tokens)
+        w.save_cursor(first_block - 1, None)
+        discord_client = FakeDiscord(args.discord_latency)
+        install_fakes(w, discord_client)
+
+        def cursor():
+            return w.metrics.gauges.get(('watcher_cursor_block', ()), 0)
+
+        # Catch-up: every block is already mined
+        tasks.append(asyncio.create_task(w.subscribe_new_heads()))
+        started = time.perf_counter()
+        tasks.append(asyncio.create_task(w.watch_transactions()))
+        await wait_until(lambda: cursor() >= head, args.timeout)
+        catchup_seconds = time.perf_counter() - started
+        catchup_alerts = sum(w.metrics.series('alerts_total').values())
+        catchup_rpcs = rpc_count(w)
+        await wait_until(lambda: not w.notifier.queues, args.timeout)
+
+        # Live: blocks arrive every block_time and are announced over the newHeads subscription
+        await wait_until(lambda: w.new_heads_subscribed, args.timeout)
+        sent_before = len(discord_client.sent)
+        start_live.set()
+        live_mined = await asyncio.get_running_loop().run_in_executor(None, mined.get)
+        await wait_until(lambda: cursor() >= head + args.live_blocks, args.timeout)
+        await wait_until(lambda: not w.notifier.queues, args.timeout)
+
+        # Latency of every first alert (not the confirmation follow-ups), digests included
+        latencies = []
+        for sent_at, _, content in discord_client.sent[sent_before:]:
+            for block in ALERT_BLOCK.findall(content):
+                if int(block) in live_mined:
+                    latencies.append((sent_at - live_mined[int(block)]) * 1000)
+
+        rpcs_by_method = {dict(labels)['method']: count for labels, count in w.metrics.series('rpc_requests_total').items()}
+        result = {
+            'addresses': address_count,
+            'users': len(w.user_addresses),
+            'blocks': args.blocks,
+            'blocks_per_sec': round(args.blocks / catchup_seconds, 2),
+            'alerts_per_sec': round(catchup_alerts / catchup_seconds, 2),
+            'alert_latency_p50_ms': round(percentile(latencies, 0.5), 1) if latencies else None,
+            'alert_latency_p99_ms': round(percentile(latencies, 0.99), 1) if latencies else None,
+            'rpcs_per_block': round(catchup_rpcs / args.blocks, 2),
+            'rpcs_by_method': rpcs_by_method,
+            'messages_sent': len(discord_client.sent),
+            'commands': await run_commands(w, args),
+        }
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        node.terminate()
+    return result
+
+
+async def run_commands(w, args):
+    """Time each benchmarked command and count the RPCs it makes."""
+    results = {}
+    ctx = FakeContext()
+    for name, function, command_args in COMMANDS:
+        latencies = []
+        rpcs_before = rpc_count(w)
+        for _ in range(args.command_runs):
+            token = w.current_command.set(name)
+            started = time.perf_counter()
+            await getattr(w, function)(ctx, *command_args)
+            latencies.append((time.perf_counter() - started) * 1000)
+            w.current_command.reset(token)
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 0.5), 1),
+            'p99_ms': round(percentile(latencies, 0.99), 1),
+            'rpcs_per_run': round((rpc_count(w) - rpcs_before) / args.command_runs, 2),
+        }
+    return results
+
+
+def print_report(report, baseline=None):
+    baseline_scenarios = {s['addresses']: s for s in baseline['scenarios']} if baseline else {}
+    header = f"{'addresses':>10} {'users':>7} {'blocks/s':>9} {'alerts/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'rpc/block':>9}"
+    print(header)
+    for scenario in report['scenarios']:
+        values = [scenario[field] for field in COMPARED_FIELDS]
+        print(f"{scenario['addresses']:>10} {scenario['users']:>7} " + ' '.join(
+            f'{"-" if value is None else value:>{width}}' for value, width in zip(values, (9, 9, 8, 8, 9))
+        ))
+        previous = baseline_scenarios.get(scenario['addresses'])
+        if previous:
+            changes = []
+            for field, higher_is_better in COMPARED_FIELDS.items():
+                old, new = previous.get(field), scenario[field]
+                if old and new is not None:
+                    change = (new - old) / old * 100
+                    better = change > 0 if higher_is_better else change < 0
+                    changes.append(f"{field} {change:+.1f}%{' ✓' if better else ''}")
+            print(f"{'':>10} vs baseline: " + ', '.join(changes))
+    print()
+    for scenario in report['scenarios']:
+        commands = ', '.join(f"{name} {c['p50_ms']}/{c['p99_ms']}ms ({c['rpcs_per_run']} rpc)" for name, c in scenario['commands'].items())
+        print(f"{scenario['addresses']:>10} addresses, commands p50/p99: {commands}")
+
+
+async def benchmark(args):
+    # The bot keeps its database, cursor and log next to the working directory
+    workdir = tempfile.mkdtemp(prefix='walletwatcher-bench-')
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import walletwatcher as w
+    w.logger.setLevel(logging.WARNING)
+    w.SCANNER_WORKERS = args.workers
+
+    replay = None
+    if args.replay:
+        with open(args.replay) as f:
+            replay = json.load(f)
+        args.blocks = min(args.blocks, len(replay))
+
+    await w.get_http_session()
+    try:
+        scenarios = []
+        for address_count in args.addresses:
+            print(f'Running scenario with {address_count} watched addresses...', file=sys.stderr)
+            scenarios.append(await run_scenario(w, args, address_count, replay))
+    finally:
+        await w.http_session.close()
+
+    config = {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'command')}
+    return {'config': config, 'scenarios': scenarios}
+
+
+async def record(args):
+    """Save consecutive mainnet blocks with full transactions and their Transfer logs for replay."""
+    async with aiohttp.ClientSession() as session:
+        async def call(method, params):
+            async with session.post(args.rpc, json={'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}) as response:
+                return (await response.json())['result']
+
+        blocks = []
+        for number in range(args.from_block, args.from_block + args.count):
+            block = await call('eth_getBlockByNumber', [hex(number), True])
+            block['logs'] = await call('eth_getLogs', [{'fromBlock': hex(number), 'toBlock': hex(number), 'topics': [fakenode.TRANSFER_TOPIC]}])
+            blocks.append(block)
+            print(f'Recorded block {number}: {len(block["transactions"])} transactions, {len(block["logs"])} transfers', file=sys.stderr)
+    with open(args.output, 'w') as f:
+        json.dump(blocks, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark for the wallet watcher.')
+    subparsers = parser.add_subparsers(dest='command')
+    recorder = subparsers.add_parser('record', help='Record mainnet blocks for --replay (needs network).')
+    recorder.add_argument('--rpc', required=True)
+    recorder.add_argument('--from-block', type=int, required=True)
+    recorder.add_argument('--count', type=int, default=50)
+    recorder.add_argument('--output', default='blocks.json')
+
+    parser.add_argument('--addresses', default='10,1000,100000', help='Comma separated watched address counts, one scenario each.')
+    parser.add_argument('--blocks', type=int, default=50, help='Blocks to catch up on per scenario.')
+    parser.add_argument('--live-blocks', type=int, default=10, help='Blocks mined live per scenario, for alert latency.')
+    parser.add_argument('--block-time', type=float, default=0.5)
+    parser.add_argument('--txs', type=int, default=150, help='Transactions per synthetic block.')
+    parser.add_argument('--transfers', type=int, default=20, help='ERC-20 transfers per synthetic block.')
+    parser.add_argument('--rpc-latency', type=float, default=0.02, help='Mean seconds the fake node takes per request.')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of RPC requests failing with a 503.')
+    parser.add_argument('--discord-latency', type=float, default=0.05, help='Seconds every Discord send takes.')
+    parser.add_argument('--command-runs', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=0, help='Scanner worker processes, as SCANNER_WORKERS.')
+    parser.add_argument('--replay', help='Recorded blocks to replay instead of synthetic ones.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds a scenario phase may take.')
+    parser.add_argument('--output', help='Write the JSON report to this file.')
+    parser.add_argument('--compare', help='Baseline JSON report to compare against.')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        asyncio.run(record(args))
+        return
+
+    args.addresses = [int(count) for count in args.addresses.split(',')]
+    if args.replay:
+        args.replay = os.path.abspath(args.replay)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    report = asyncio.run(benchmark(args))
+    print_report(report, baseline)
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+"""Scripted stand-in Ethereum node for running WalletWatcher offline.
+
+Serves JSON-RPC over HTTP (POST /) and over a WebSocket (GET /) on the same
+port, mines a synthetic block every few seconds and pushes `newHeads`
+notifications to WebSocket subscribers.
+
+Usage:
+    python fakenode.py --port 8545 --block-time 2 --txs 150
+
+Then point the bot at it:
+    INFURA_URL=http://127.0.0.1:8545 INFURA_WS_URL=ws://127.0.0.1:8545 python walletwatcher.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import deque
+
+from aiohttp import web, WSMsgType
+from eth_abi import decode, encode
+
+
+def to_hex(value):
+    return hex(value)
+
+
+def make_hash(*parts):
+    return '0x' + hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def encode_uint(value):
+    return '%064x' % value
+
+
+def encode_string(value):
+    data = value.encode()
+    padded = data.hex().ljust(((len(data) + 31) // 32) * 64, '0')
+    return encode_uint(32) + encode_uint(len(data)) + padded
+
+
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+MULTICALL3_ADDRESS = '0xca11bde05977b3631167028862be2a173976ca11'
+
+# ERC-20 selectors answered by eth_call
+SELECTORS = {
+    '0x06fdde03': 'name',
+    '0x95d89b41': 'symbol',
+    '0x313ce567': 'decimals',
+    '0x18160ddd': 'totalSupply',
+    '0x70a08231': 'balanceOf',
+}
+
+
+class FakeNode:
+    """In-memory chain served over JSON-RPC.
+
+    Blocks are synthetic, or replayed from `replay`, a list of recorded
+    eth_getBlockByNumber results with full transactions (each optionally
+    carrying its Transfer `logs`), before going synthetic. HTTP requests can
+    be slowed by `latency` seconds (+/- 50% jitter) and fail with a 503 at
+    `error_rate`, to mimic a remote provider.
+    """
+
+    def __init__(self, txs_per_block=150, transfers_per_block=20, addresses=None, start_block=1, seed=0,
+                 latency=0, error_rate=0, replay=None):
+        self.txs_per_block = txs_per_block
+        self.transfers_per_block = transfers_per_block
+        self.latency = latency
+        self.error_rate = error_rate
+        self.replay = deque(replay or [])
+        if self.replay:
+            start_block = int(self.replay[0]['number'], 16)
+        self.random = random.Random(seed)
+        # Separate stream for latency and errors, so they don't change the generated chain
+        self.faults = random.Random(seed + 1)
+        # Pool of addresses the synthetic transactions are drawn from
+        self.addresses = addresses or ['0x%040x' % self.random.getrandbits(160) for _ in range(1000)]
+        # Token contract address -> (name, symbol, decimals)
+        self.tokens = {
+            '0x%040x' % self.random.getrandbits(160): ('Fake Dollar', 'FUSD', 6),
+            '0x%040x' % self.random.getrandbits(160): ('Fake Ether', 'FETH', 18),
+        }
+        self.blocks = {}
+        # Block number -> wall clock time it was mined, for measuring alert latency
+        self.mined_at = {}
+        self.transactions = {}
+        self.logs = {}
+        self.head = start_block - 1
+        self.subscriptions = {}
+        # Transactions of the next block, visible to pending transaction filters until mined
+        self.mempool = []
+        self.mempool_logs = []
+        self.pending_filters = {}
+        # Bumped on every reorg so replacement blocks and transactions get new hashes
+        self.fork = 0
+        self.prepare_mempool()
+        self.mine_block()
+
+    def make_transaction(self, block_number, index):
+        sender, recipient = self.random.sample(self.addresses, 2)
+        tx = {
+            'hash': make_hash('tx', block_number, index, self.fork),
+            'blockNumber': None,
+            'blockHash': None,
+            'transactionIndex': None,
+            'from': sender,
+            'to': recipient,
+            'value': to_hex(self.random.randrange(10 ** 15, 10 ** 19)),
+            'gas': to_hex(21000),
+            'gasPrice': to_hex(self.random.randrange(10 ** 9, 10 ** 11)),
+            'nonce': to_hex(index),
+            'input': '0x',
+            'type': '0x0',
+            'v': '0x25',
+            'r': '0x1',
+            's': '0x1',
+        }
+        self.transactions[tx['hash']] = tx
+        return tx
+
+    def make_transfer(self, block_number, index):
+        """Turn transaction `index` into an ERC-20 transfer and return its Transfer log."""
+        tx = self.make_transaction(block_number, index)
+        token = self.random.choice(list(self.tokens))
+        decimals = self.tokens[token][2]
+        sender, recipient = tx['from'], tx['to']
+        tx.update({'to': token, 'value': '0x0'})
+        return {
+            'address': token,
+            'topics': [TRANSFER_TOPIC, '0x' + '00' * 12 + sender[2:], '0x' + '00' * 12 + recipient[2:]],
+            'data': '0x' + encode_uint(self.random.randrange(1, 10 ** 4) * 10 ** decimals),
+            'blockNumber': to_hex(block_number),
+            'blockHash': None,
+            'transactionHash': tx['hash'],
+            'transactionIndex': to_hex(index),
+            'logIndex': to_hex(index),
+            'removed': False,
+        }
+
+    def prepare_mempool(self):
+        number = self.head + 1
+        if self.replay:
+            recorded = self.replay[0]
+            self.mempool = [dict(tx, blockNumber=None, blockHash=None, transactionIndex=None) for tx in recorded['transactions']]
+            self.mempool_logs = [dict(log) for log in recorded.get('logs', [])]
+            self.transactions.update((tx['hash'], tx) for tx in self.mempool)
+        else:
+            self.mempool = [self.make_transaction(number, i) for i in range(self.txs_per_block)]
+            self.mempool_logs = [self.make_transfer(number, self.txs_per_block + i) for i in range(self.transfers_per_block)]
+            self.mempool += [self.transactions[log['transactionHash']] for log in self.mempool_logs]
+        for hashes in self.pending_filters.values():
+            hashes.extend(tx['hash'] for tx in self.mempool)
+
+    def mine_block(self):
+        number = self.head + 1
+        parent = self.blocks.get(self.head)
+        if self.replay:
+            block = self.replayed_header(self.replay.popleft())
+        else:
+            block = self.synthetic_header(number, parent)
+        block_hash = block['hash']
+        for index, tx in enumerate(self.mempool):
+            tx.update({'blockNumber': to_hex(number), 'blockHash': block_hash, 'transactionIndex': to_hex(index)})
+        for log in self.mempool_logs:
+            log['blockHash'] = block_hash
+        block['transactions'] = self.mempool
+        self.logs[number] = self.mempool_logs
+        self.blocks[number] = block
+        self.mined_at[number] = time.time()
+        self.head = number
+        self.prepare_mempool()
+        return block
+
+    def replayed_header(self, recorded):
+        return {key: value for key, value in recorded.items() if key not in ('transactions', 'logs')}
+
+    def synthetic_header(self, number, parent):
+        return {
+            'number': to_hex(number),
+            'hash': make_hash('block', number, self.fork),
+            'parentHash': parent['hash'] if parent else '0x' + '00' * 32,
+            'timestamp': to_hex(1700000000 + number * 12),
+            'miner': '0x' + '00' * 20,
+            'difficulty': '0x0',
+            'totalDifficulty': '0x0',
+            'extraData': '0x',
+            'gasLimit': to_hex(30000000),
+            'gasUsed': to_hex(21000 * self.txs_per_block),
+            'baseFeePerGas': to_hex(10 ** 9),
+            'logsBloom': '0x' + '00' * 256,
+            'nonce': '0x0000000000000000',
+            'mixHash': '0x' + '00' * 32,
+            'sha3Uncles': '0x' + '00' * 32,
+            'stateRoot': '0x' + '00' * 32,
+            'receiptsRoot': '0x' + '00' * 32,
+            'transactionsRoot': '0x' + '00' * 32,
+            'size': to_hex(1000),
+            'uncles': [],
+        }
+
+    def reorg(self, depth):
+        """Replace the last `depth` blocks with a fork of new blocks, as a chain reorganization would."""
+        self.fork += 1
+        for number in range(self.head - depth + 1, self.head + 1):
+            del self.blocks[number]
+            self.logs.pop(number, None)
+        self.head -= depth
+        self.prepare_mempool()
+        return [self.mine_block() for _ in range(depth)]
+
+    def header(self, block):
+        return {key: value for key, value in block.items() if key != 'transactions'}
+
+    def get_block(self, identifier, full):
+        block = self.blocks.get(self.block_number(identifier))
+        if block is None:
+            return None
+        if full:
+            return block
+        return {**block, 'transactions': [tx['hash'] for tx in block['transactions']]}
+
+    def block_number(self, identifier):
+        if identifier in (None, 'latest', 'pending', 'safe', 'finalized'):
+            return self.head
+        if identifier == 'earliest':
+            return min(self.blocks)
+        return identifier if isinstance(identifier, int) else int(identifier, 16)
+
+    def get_logs(self, log_filter):
+        from_block = self.block_number(log_filter.get('fromBlock'))
+        to_block = self.block_number(log_filter.get('toBlock'))
+        addresses = log_filter.get('address')
+        if isinstance(addresses, str):
+            addresses = [addresses]
+        topic_filter = log_filter.get('topics') or []
+        matches = []
+        for number in range(from_block, to_block + 1):
+            for log in self.logs.get(number, []):
+                if addresses and log['address'] not in [a.lower() for a in addresses]:
+                    continue
+                if all(
+                    wanted is None or log['topics'][i] in (wanted if isinstance(wanted, list) else [wanted])
+                    for i, wanted in enumerate(topic_filter)
+                ):
+                    matches.append(log)
+        return matches
+
+    def multicall(self, data):
+        """Answer Multicall3 aggregate3 and getEthBalance by running each inner call locally."""
+        selector, arguments = data[:10], bytes.fromhex(data[10:])
+        if selector == '0x4d2301cc':
+            return '0x' + encode_uint(10 ** 18)
+        if selector != '0x82ad56cb':
+            return '0x'
+        (calls,) = decode(['(address,bool,bytes)[]'], arguments)
+        results = []
+        for target, _, call_data in calls:
+            return_data = self.call({'to': target, 'data': '0x' + call_data.hex()})
+            results.append((True, bytes.fromhex(return_data[2:])))
+        return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
+
+    def call(self, transaction):
+        data = transaction.get('data', transaction.get('input', ''))
+        if transaction['to'].lower() == MULTICALL3_ADDRESS:
+            return self.multicall(data)
+        token = self.tokens.get(transaction['to'].lower())
+        selector = SELECTORS.get(data[:10])
+        if token is None or selector is None:
+            return '0x'
+        name, symbol, decimals = token
+        if selector == 'name':
+            return '0x' + encode_string(name)
+        if selector == 'symbol':
+            return '0x' + encode_string(symbol)
+        if selector == 'decimals':
+            return '0x' + encode_uint(decimals)
+        if selector == 'totalSupply':
+            return '0x' + encode_uint(10 ** 9 * 10 ** decimals)
+        return '0x' + encode_uint(1234 * 10 ** decimals)
+
+    def dispatch(self, method, params):
+        if method == 'eth_chainId':
+            return '0x1'
+        if method == 'net_version':
+            return '1'
+        if method == 'web3_clientVersion':
+            return 'FakeNode/v1'
+        if method == 'eth_blockNumber':
+            return to_hex(self.head)
+        if method == 'eth_gasPrice':
+            return to_hex(20 * 10 ** 9)
+        if method == 'eth_getBlockByNumber':
+            return self.get_block(params[0], params[1])
+        if method == 'eth_getBlockByHash':
+            for block in self.blocks.values():
+                if block['hash'] == params[0]:
+                    return self.get_block(block['number'], params[1])
+            return None
+        if method == 'eth_getTransactionByHash':
+            return self.transactions.get(params[0])
+        if method == 'eth_getBalance':
+            return to_hex(10 ** 18)
+        if method == 'eth_getTransactionCount':
+            return '0x0'
+        if method == 'eth_newPendingTransactionFilter':
+            filter_id = to_hex(len(self.pending_filters) + 1)
+            self.pending_filters[filter_id] = []
+            return filter_id
+        if method == 'eth_getFilterChanges':
+            if params[0] not in self.pending_filters:
+                raise ValueError('filter not found')
+            hashes, self.pending_filters[params[0]] = self.pending_filters[params[0]], []
+            return hashes
+        if method == 'eth_uninstallFilter':
+            return self.pending_filters.pop(params[0], None) is not None
+        if method == 'eth_getLogs':
+            return self.get_logs(params[0])
+        if method == 'eth_call':
+            return self.call(params[0])
+        raise ValueError(f'Method {method} not supported by the fake node')
+
+    def handle(self, request):
+        try:
+            result = self.dispatch(request['method'], request.get('params', []))
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': result}
+        except Exception as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32601, 'message': str(e)}}
+
+    async def http_handler(self, request):
+        if request.headers.get('Upgrade', '').lower() == 'websocket':
+            return await self.ws_handler(request)
+        if self.latency:
+            await asyncio.sleep(self.latency * self.faults.uniform(0.5, 1.5))
+        if self.error_rate and self.faults.random() < self.error_rate:
+            return web.json_response({'error': 'injected failure'}, status=503)
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response([self.handle(r) for r in payload])
+        return web.json_response(self.handle(payload))
+
+    async def ws_handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        async for message in ws:
+            # web3.py sends its requests as binary frames
+            if message.type not in (WSMsgType.TEXT, WSMsgType.BINARY):
+                break
+            payload = json.loads(message.data)
+            if payload.get('method') == 'eth_subscribe' and payload['params'][0] == 'newHeads':
+                subscription_id = make_hash('sub', id(ws), len(self.subscriptions))[:34]
+                self.subscriptions[subscription_id] = ws
+                await ws.send_json({'jsonrpc': '2.0', 'id': payload['id'], 'result': subscription_id})
+            elif payload.get('method') == 'eth_unsubscribe':
+                removed = self.subscriptions.pop(payload['params'][0], None) is not None
+                await ws.send_json({'jsonrpc': '2.0', 'id': payload['id'], 'result': removed})
+            else:
+                await ws.send_json(self.handle(payload))
+        for subscription_id, subscriber in list(self.subscriptions.items()):
+            if subscriber is ws:
+                del self.subscriptions[subscription_id]
+        return ws
+
+    async def publish_head(self, block):
+        header = self.header(block)
+        for subscription_id, ws in list(self.subscriptions.items()):
+            try:
+                await ws.send_json({
+                    'jsonrpc': '2.0',
+                    'method': 'eth_subscription',
+                    'params': {'subscription': subscription_id, 'result': header}
+                })
+            except ConnectionResetError:
+                self.subscriptions.pop(subscription_id, None)
+
+    async def mine_forever(self, block_time):
+        while True:
+            await asyncio.sleep(block_time)
+            await self.publish_head(self.mine_block())
+
+    def make_app(self):
+        app = web.Application()
+        app.router.add_route('*', '/', self.http_handler)
+        return app
+
+    async def start(self, host='127.0.0.1', port=8545, block_time=None):
+        """Start serving in the running event loop and return the aiohttp runner."""
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        if block_time:
+            self.miner = asyncio.create_task(self.mine_forever(block_time))
+        return runner
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Scripted stand-in Ethereum JSON-RPC/WebSocket node.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8545)
+    parser.add_argument('--block-time', type=float, default=2.0, help='Seconds between mined blocks.')
+    parser.add_argument('--txs', type=int, default=150, help='Transactions per block.')
+    parser.add_argument('--transfers', type=int, default=20, help='ERC-20 transfers per block.')
+    parser.add_argument('--watch', action='append', default=[], help='Address to include in the transaction pool.')
+    parser.add_argument('--latency', type=float, default=0, help='Mean seconds added to every HTTP request.')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of HTTP requests answered with a 503.')
+    parser.add_argument('--replay', help='JSON file of recorded blocks to serve before synthetic ones.')
+    args = parser.parse_args()
+
+    replay = None
+    if args.replay:
+        with open(args.replay) as f:
+            replay = json.load(f)
+    node = FakeNode(txs_per_block=args.txs, transfers_per_block=args.transfers,
+                    latency=args.latency, error_rate=args.error_rate, replay=replay)
+    node.addresses.extend(address.lower() for address in args.watch)
+    await node.start(args.host, args.port, args.block_time)
+    print(f'Fake node listening on http://{args.host}:{args.port} and ws://{args.host}:{args.port}')
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
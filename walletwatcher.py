@@ -1,11 +1,33 @@
 import asyncio
+import aiohttp
+from aiohttp import web
 import discord
 from discord.ext import commands
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
+from web3 import AsyncWeb3, Web3, WebsocketProviderV2
+from web3.middleware import async_geth_poa_middleware
+from web3.providers.async_base import AsyncJSONBaseProvider
+from web3.datastructures import AttributeDict
+from web3.exceptions import BlockNotFound, CannotHandleRequest
+from web3._utils.method_formatters import log_entry_formatter, transaction_result_formatter
 import random
 import logging
 import json
+import os
+import sqlite3
+import itertools
+import multiprocessing
+import time
+import bisect
+import math
+import cProfile
+import contextvars
+import contextlib
+import csv
+import io
+from array import array
+from collections import Counter, OrderedDict, deque, namedtuple
+from urllib.parse import urlsplit
+from decimal import Decimal
 
 # Create a custom logger
 logger = logging.getLogger(__name__)
@@ -30,9 +52,470 @@ logger.addHandler(c_handler)
 logger.addHandler(f_handler)
 
 # Web3 setup
-infura_url = 'https://mainnet.infura.io/v3/YOUR_INFURA_PROJECT_ID'
-web3 = Web3(Web3.HTTPProvider(infura_url))
-web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+infura_url = os.getenv('INFURA_URL', 'https://mainnet.infura.io/v3/YOUR_INFURA_PROJECT_ID')
+# Optional comma separated list of HTTP endpoints to spread requests over, each
+# optionally suffixed with |<requests per second>, e.g. https://a|25,https://b
+rpc_urls = os.getenv('RPC_URLS', infura_url)
+# Optional WebSocket endpoint, when set new blocks are pushed through a newHeads subscription
+infura_ws_url = os.getenv('INFURA_WS_URL')
+
+# Pooled HTTP session shared by every RPC call, created on first use
+RPC_POOL_SIZE = 20
+RPC_TIMEOUT = 30
+http_session = None
+
+async def get_http_session():
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=RPC_POOL_SIZE),
+            timeout=aiohttp.ClientTimeout(total=RPC_TIMEOUT)
+        )
+    return http_session
+
+# Metrics settings, the /metrics endpoint is only served when METRICS_PORT is set
+METRICS_PORT = os.getenv('METRICS_PORT')
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PREFIX = 'walletwatcher_'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Fraction of block batches whose matching and decoding run under cProfile, with the stats saved to SCAN_PROFILE_DIR
+SCAN_PROFILE_RATE = float(os.getenv('SCAN_PROFILE_RATE', '0'))
+SCAN_PROFILE_DIR = os.getenv('SCAN_PROFILE_DIR', 'profiles')
+
+class Histogram:
+    """Latency histogram with fixed buckets, as Prometheus expects them."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.sum += other.sum
+        self.count += other.count
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return bound
+        return None
+
+class Metrics:
+    """In-process counters, gauges and histograms, rendered in the Prometheus text format.
+
+    Series are keyed by name and a sorted tuple of label pairs. Collectors are
+    called before rendering to refresh gauges read from other parts of the bot.
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def set_total(self, name, value, **labels):
+        """Set a counter that is kept elsewhere, such as a cache's hit count."""
+        self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def series(self, name, kind='counters'):
+        """Return {labels dict as tuple: value} for one metric."""
+        return {labels: value for (series_name, labels), value in getattr(self, kind).items() if series_name == name}
+
+    def drain(self):
+        """Return the counters and histograms recorded so far and start over, for shipping to another process."""
+        snapshot = (self.counters, self.histograms)
+        self.counters, self.histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        counters, histograms = snapshot
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+        for key, histogram in histograms.items():
+            if key in self.histograms:
+                self.histograms[key].merge(histogram)
+            else:
+                self.histograms[key] = histogram
+
+    def collect(self):
+        for collector in self.collectors:
+            collector()
+
+    def render(self):
+        self.collect()
+        lines = []
+
+        def format_labels(labels, extra=()):
+            pairs = tuple(labels) + tuple(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        for kind, series in (('counter', self.counters), ('gauge', self.gauges)):
+            for name in sorted({name for name, _ in series}):
+                lines.append(f'# TYPE {METRICS_PREFIX}{name} {kind}')
+                for (series_name, labels), value in sorted(series.items()):
+                    if series_name == name:
+                        lines.append(f'{METRICS_PREFIX}{name}{format_labels(labels)} {value}')
+        for name in sorted({name for name, _ in self.histograms}):
+            lines.append(f'# TYPE {METRICS_PREFIX}{name} histogram')
+            for (series_name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (math.inf,), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else bound
+                    lines.append(f'{METRICS_PREFIX}{name}_bucket{format_labels(labels, [("le", le)])} {cumulative}')
+                lines.append(f'{METRICS_PREFIX}{name}_sum{format_labels(labels)} {histogram.sum}')
+                lines.append(f'{METRICS_PREFIX}{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+# Name of the command being run, so the RPCs it makes can be attributed to it
+current_command = contextvars.ContextVar('current_command', default=None)
+
+def record_rpc(method, elapsed, ok, calls=1):
+    metrics.inc('rpc_requests_total', calls, method=method)
+    if not ok:
+        metrics.inc('rpc_errors_total', calls, method=method)
+    metrics.observe('rpc_latency_seconds', elapsed, method=method)
+    command = current_command.get()
+    if command:
+        metrics.inc('command_rpc_requests_total', calls, command=command)
+
+# Endpoint pool settings
+RPC_MAX_ATTEMPTS = 4
+RPC_BACKOFF_BASE = 0.2
+RPC_BACKOFF_MAX = 5
+# Seconds an endpoint is skipped after failing a request, or after throttling us, while
+# another endpoint can take over. Without one the pause starts at RPC_BACKOFF_BASE and
+# doubles with each failure in a row, unless the node sends Retry-After.
+RPC_FAILURE_COOLDOWN = 5
+RPC_THROTTLE_COOLDOWN = 30
+RPC_LATENCY_SMOOTHING = 0.2
+RPC_ERROR_PENALTY = 5
+# A hedged request goes to a second endpoint if the first hasn't answered in time.
+# Only head lookups are hedged, numbered full blocks are too large to send twice.
+RPC_HEDGE_DELAY = 0.3
+RPC_HEDGED_METHODS = {'eth_blockNumber'}
+
+def is_hedged(method, params):
+    return method in RPC_HEDGED_METHODS or (method == 'eth_getBlockByNumber' and params[0] == 'latest')
+# Endpoint every RPC of the current task goes to, set while calls must see the same chain
+rpc_pin = contextvars.ContextVar('rpc_pin', default=None)
+
+# JSON-RPC error codes that mean the endpoint is throttling us rather than rejecting the call
+RPC_THROTTLE_CODES = {-32005, -32090, 429}
+# Filters live on the node that created them, so they are polled and removed there too
+RPC_NEW_FILTER_METHODS = {'eth_newFilter', 'eth_newBlockFilter', 'eth_newPendingTransactionFilter'}
+RPC_FILTER_METHODS = {'eth_getFilterChanges', 'eth_getFilterLogs', 'eth_uninstallFilter'}
+
+class RPCEndpointError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_retry_after(value):
+    # Only the delay-seconds form, an HTTP date falls back to our own cooldown
+    try:
+        return max(float(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+class Endpoint:
+    """An RPC endpoint with its health stats and an optional requests per second budget."""
+
+    def __init__(self, url, rate=None):
+        self.url = url
+        self.rate = rate
+        self.tokens = rate
+        self.refilled_at = time.monotonic()
+        self.latency = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.failure_streak = 0
+        self.cooldown_until = 0
+
+    def ready_at(self, now):
+        """Return when the endpoint is next usable, i.e. out of cooldown with budget left."""
+        if self.rate is not None:
+            self.tokens = min(self.rate, self.tokens + (now - self.refilled_at) * self.rate)
+            self.refilled_at = now
+            if self.tokens <= 0:
+                return max(self.cooldown_until, now + (1 - self.tokens) / self.rate)
+        return max(self.cooldown_until, now)
+
+    def spend(self, cost):
+        self.requests += cost
+        if self.rate is not None:
+            # Batches may overdraw the bucket, the endpoint then rests until it refills
+            self.tokens -= cost
+
+    def score(self):
+        # Seconds of expected latency, lower is better. Endpoints we have no
+        # latency for yet get tried first, errors weigh as a fixed penalty
+        return (self.latency or 0) + self.error_rate * RPC_ERROR_PENALTY
+
+    def record(self, latency, ok):
+        if ok:
+            self.latency = latency if self.latency is None else self.latency + RPC_LATENCY_SMOOTHING * (latency - self.latency)
+            self.failure_streak = 0
+        else:
+            self.errors += 1
+            self.failure_streak += 1
+        self.error_rate += RPC_LATENCY_SMOOTHING * ((0 if ok else 1) - self.error_rate)
+
+    def __str__(self):
+        # Endpoint URLs often carry API keys, only show the host and port
+        url = urlsplit(self.url)
+        return f'{url.hostname}:{url.port}' if url.port else url.hostname or self.url
+
+def parse_endpoints(urls):
+    endpoints = []
+    for entry in urls.split(','):
+        url, _, rate = entry.strip().partition('|')
+        if url:
+            endpoints.append(Endpoint(url, float(rate) if rate else None))
+    return endpoints
+
+class RPCPool(AsyncJSONBaseProvider):
+    """Web3 provider that routes every request to the healthiest endpoint with budget left."""
+
+    def __init__(self, endpoints):
+        super().__init__()
+        self.endpoints = endpoints
+        # filter id -> the endpoint that created it
+        self.filter_endpoints = {}
+
+    def share_rates(self, processes):
+        """Keep this process to its share of every endpoint's budget when several processes use the pool."""
+        for endpoint in self.endpoints:
+            if endpoint.rate is not None:
+                endpoint.rate /= processes
+                endpoint.tokens = min(endpoint.tokens, endpoint.rate)
+
+    async def ranked(self, pinned=None):
+        """Return the usable endpoints, best first, waiting for one to free up if there are none.
+
+        With a pinned endpoint only that one is returned, once it is usable.
+        """
+        candidates = [pinned] if pinned else self.endpoints
+        while True:
+            now = time.monotonic()
+            ready = {endpoint: endpoint.ready_at(now) for endpoint in candidates}
+            available = [endpoint for endpoint, at in ready.items() if at <= now]
+            if available:
+                return sorted(available, key=Endpoint.score)
+            await asyncio.sleep(min(ready.values()) - now)
+
+    async def post(self, endpoint, body, cost):
+        endpoint.spend(cost)
+        session = await get_http_session()
+        started = time.monotonic()
+        try:
+            async with session.post(endpoint.url, data=body, headers={'Content-Type': 'application/json'}) as response:
+                if response.status == 429:
+                    raise RPCEndpointError(f'{endpoint} is rate limiting requests', parse_retry_after(response.headers.get('Retry-After')))
+                response.raise_for_status()
+                result = await response.json(content_type=None)
+            errors = [r.get('error') for r in (result if isinstance(result, list) else [result])]
+            if any(error and error.get('code') in RPC_THROTTLE_CODES for error in errors):
+                raise RPCEndpointError(f'{endpoint} is rate limiting requests')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            endpoint.record(time.monotonic() - started, False)
+            endpoint.cooldown_until = time.monotonic() + self.cooldown(endpoint, e)
+            raise
+        endpoint.record(time.monotonic() - started, True)
+        return result
+
+    def cooldown(self, endpoint, error):
+        """Seconds to skip an endpoint after it failed a request with the given error."""
+        if getattr(error, 'retry_after', None) is not None:
+            return error.retry_after
+        now = time.monotonic()
+        if any(other.ready_at(now) <= now for other in self.endpoints if other is not endpoint):
+            return RPC_THROTTLE_COOLDOWN if isinstance(error, RPCEndpointError) else RPC_FAILURE_COOLDOWN
+        # Nowhere to fail over to, a long pause would stall every caller
+        return min(RPC_BACKOFF_MAX, RPC_BACKOFF_BASE * 2 ** (endpoint.failure_streak - 1))
+
+    async def hedged_post(self, endpoints, body, cost):
+        # Fire at the best endpoint, and at the runner-up if the first is slow
+        tasks = [asyncio.ensure_future(self.post(endpoints[0], body, cost))]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=RPC_HEDGE_DELAY)
+            if not done and len(endpoints) > 1:
+                tasks.append(asyncio.ensure_future(self.post(endpoints[1], body, cost)))
+            error = None
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as e:
+                    error = e
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def send(self, body, cost=1, hedge=False, pinned=None):
+        """Send an encoded JSON-RPC request, failing over to other endpoints with jittered back-off.
+
+        A pinned request only goes to the given endpoint, retries included.
+        """
+        for attempt in range(RPC_MAX_ATTEMPTS):
+            # A failure lowers the endpoint's score, so retries move on to the next best one
+            endpoints = await self.ranked(pinned)
+            try:
+                if hedge:
+                    return await self.hedged_post(endpoints, body, cost)
+                return await self.post(endpoints[0], body, cost)
+            except (aiohttp.ClientError, asyncio.TimeoutError, RPCEndpointError) as e:
+                if attempt == RPC_MAX_ATTEMPTS - 1:
+                    raise
+                delay = random.uniform(0, min(RPC_BACKOFF_MAX, RPC_BACKOFF_BASE * 2 ** attempt))
+                logger.warning(f'RPC request to {endpoints[0]} failed ({e}), retrying in {delay:.2f}s')
+                await asyncio.sleep(delay)
+
+    async def make_request(self, method, params):
+        pinned = rpc_pin.get()
+        if method in RPC_NEW_FILTER_METHODS:
+            pinned = (await self.ranked())[0]
+        elif method in RPC_FILTER_METHODS:
+            # Unknown ids, e.g. from before a restart, are routed like any other call
+            pinned = self.filter_endpoints.get(params[0])
+        started = time.perf_counter()
+        try:
+            response = await self.send(self.encode_rpc_request(method, params), hedge=is_hedged(method, params), pinned=pinned)
+        except Exception:
+            record_rpc(method, time.perf_counter() - started, False)
+            raise
+        record_rpc(method, time.perf_counter() - started, 'error' not in response)
+        if method in RPC_NEW_FILTER_METHODS and 'result' in response:
+            self.filter_endpoints[response['result']] = pinned
+        elif method == 'eth_uninstallFilter':
+            self.filter_endpoints.pop(params[0], None)
+        return response
+
+rpc_pool = RPCPool(parse_endpoints(rpc_urls))
+web3 = AsyncWeb3(rpc_pool)
+web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+
+# Maximum number of calls sent in a single JSON-RPC batch request
+RPC_BATCH_SIZE = 100
+
+# Multicall3 is deployed at the same address on mainnet and most other chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+MULTICALL_BATCH_SIZE = 500
+# Batches in flight at once, across all commands
+MULTICALL_CONCURRENCY = 4
+
+# Cache settings, the TTLs (in seconds) only apply to values that change on chain
+CONTRACT_CACHE_SIZE = 1000
+CHECKSUM_CACHE_SIZE = 10000
+TOKEN_METADATA_CACHE_SIZE = 5000
+RPC_CACHE_SIZE = 10000
+BALANCE_TTL = 15
+TOTAL_SUPPLY_TTL = 60
+GAS_PRICE_TTL = 10
+BLOCK_NUMBER_TTL = 2
+
+# Block watcher settings
+# Number of scanner worker processes, 0 scans blocks inside the bot process
+SCANNER_WORKERS = int(os.getenv('SCANNER_WORKERS', '0'))
+SCANNER_TIMEOUT = 120
+POLL_INTERVAL = 5
+CATCHUP_BATCH_SIZE = 20
+# Recent headers kept for reorg detection, must be larger than CONFIRMATION_BLOCKS
+HEADER_BUFFER_SIZE = 64
+# Times a scan batch is fetched again when its blocks change while their logs are fetched
+SCAN_REFETCH_ATTEMPTS = 3
+CONFIRMATION_BLOCKS = 12
+WATCHER_STATE_FILE = 'watcher_state.json'
+
+# ERC-20 Transfer log settings, the topic is keccak256('Transfer(address,address,uint256)')
+TRANSFER_TOPIC = '0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef'
+LOG_TOPIC_CHUNK_SIZE = 500
+# Beyond this many watched addresses, personal and guild watchlists together, every
+# Transfer log is fetched and matched locally, in requests of UNFILTERED_LOG_BLOCKS blocks
+LOG_TOPIC_FILTER_MAX = 1000
+UNFILTERED_LOG_BLOCKS = 5
+
+# Watchlist limits, guild watchlists live in SQLite with only a compact address set in memory
+MAX_USER_ADDRESSES = 10000
+MAX_USER_TOKENS = 1000
+MAX_ALIAS_LENGTH = 64
+MAX_GUILD_WATCHLIST = 200000
+MAX_IMPORT_BYTES = 16 * 1024 * 1024
+# Imports are parsed, validated and stored this many rows at a time, yielding to the event loop in between
+IMPORT_CHUNK_SIZE = 1000
+LIST_PAGE_SIZE = 20
+
+# Historical backfill settings
+HISTORY_CHUNK_SIZE = 50
+HISTORY_BLOCKS_PER_REQUEST = 10
+HISTORY_WORKERS = 8
+HISTORY_CONCURRENCY = 16
+HISTORY_MAX_SCANS = 4
+HISTORY_MAX_BLOCKS = 100000
+HISTORY_PROGRESS_INTERVAL = 2
+
+# Notification delivery settings
+NOTIFY_QUEUE_SIZE = 50
+NOTIFY_DIGEST_THRESHOLD = 10
+NOTIFY_DIGEST_MAX_LINES = 20
+NOTIFY_CONCURRENCY = 10
+
+# Startup greeting, sent once per process to the first writable channel of each guild
+SEND_GREETINGS = os.getenv('SEND_GREETINGS', '1') != '0'
+GREETING_CONCURRENCY = 5
+
+# Mempool watch settings
+PENDING_POLL_INTERVAL = 1
+PENDING_SEEN_SIZE = 50000
+PENDING_MAX_PER_POLL = 2000
+
+# WebSocket ingestion settings
+WS_IDLE_TIMEOUT = 60
+WS_RECONNECT_DELAY = 1
+WS_MAX_RECONNECT_DELAY = 60
+
+# Paged command output settings, pages are rendered only when someone turns to them
+PAGE_VIEW_TIMEOUT = 300
+BLOCK_TX_PAGE_SIZE = 10
+RECEIPT_LOGS_PAGE_SIZE = 5
+# Balance calls per !portfolio page, a page holds as many addresses as fit
+PORTFOLIO_MAX_CALLS = 1000
+# Discord's embed field value and description limits
+EMBED_FIELD_LIMIT = 1024
+EMBED_DESCRIPTION_LIMIT = 4096
 
 # Discord bot setup
 intents = discord.Intents.default()
@@ -68,25 +551,295 @@ erc20_abi = """[
     {"anonymous":false,"inputs":[{"indexed":true,"name":"_owner","type":"address"},{"indexed":true,"name":"_spender","type":"address"},{"indexed":false,"name":"_value","type":"uint256"}],"name":"Approval","type":"event"}
 ]"""
 
-# Functions to save and load user data
-def save_data():
-    with open('user_data.json', 'w') as f:
-        json.dump({
-            'user_addresses': user_addresses,
-            'tracked_addresses': tracked_addresses,
-            'token_addresses': token_addresses
-        }, f)
+# Multicall3 ABI, only the functions the bot uses
+multicall3_abi = """[
+    {"inputs":[{"components":[{"name":"target","type":"address"},{"name":"allowFailure","type":"bool"},{"name":"callData","type":"bytes"}],"name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"name":"success","type":"bool"},{"name":"returnData","type":"bytes"}],"name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"},
+    {"inputs":[{"name":"addr","type":"address"}],"name":"getEthBalance","outputs":[{"name":"balance","type":"uint256"}],"stateMutability":"view","type":"function"}
+]"""
+
+# Parse the ABIs once, contract objects built from a JSON string re-parse it every time
+erc20_abi = json.loads(erc20_abi)
+multicall3_abi = json.loads(multicall3_abi)
+
+# Persistent storage, SQLite in WAL mode so every change is a small atomic row write
+DATABASE_FILE = 'user_data.db'
+LEGACY_DATA_FILE = 'user_data.json'
+
+def open_database():
+    db = sqlite3.connect(DATABASE_FILE)
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS addresses (
+            user_id INTEGER NOT NULL,
+            alias TEXT NOT NULL,
+            address TEXT NOT NULL,
+            tracked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, alias)
+        );
+        CREATE TABLE IF NOT EXISTS tokens (
+            user_id INTEGER NOT NULL,
+            alias TEXT NOT NULL,
+            address TEXT NOT NULL,
+            PRIMARY KEY (user_id, alias)
+        );
+        CREATE TABLE IF NOT EXISTS guild_settings (
+            guild_id INTEGER PRIMARY KEY,
+            alert_channel_id INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS guild_watchlist (
+            guild_id INTEGER NOT NULL,
+            address BLOB NOT NULL,
+            label TEXT,
+            PRIMARY KEY (guild_id, address)
+        );
+        CREATE INDEX IF NOT EXISTS guild_watchlist_address ON guild_watchlist (address);
+    """)
+    # Databases created before mempool watching lack the pending column
+    columns = [row[1] for row in db.execute('PRAGMA table_info(addresses)')]
+    if 'pending' not in columns:
+        with db:
+            db.execute('ALTER TABLE addresses ADD COLUMN pending INTEGER NOT NULL DEFAULT 0')
+    return db
+
+db = open_database()
+
+def migrate_legacy_data():
+    """Import user_data.json into the database once, then move it out of the way."""
+    if not os.path.exists(LEGACY_DATA_FILE):
+        return
+
+    with open(LEGACY_DATA_FILE, 'r') as f:
+        data = json.load(f)
+    # JSON object keys are strings, Discord user ids are ints
+    tracked = {(int(user_id), alias) for user_id, addresses in data.get('tracked_addresses', {}).items() for alias in addresses}
+    with db:
+        for user_id, addresses in data.get('user_addresses', {}).items():
+            for alias, address in addresses.items():
+                db.execute(
+                    'INSERT OR REPLACE INTO addresses (user_id, alias, address, tracked) VALUES (?, ?, ?, ?)',
+                    (int(user_id), alias, address.lower(), (int(user_id), alias) in tracked)
+                )
+        for user_id, addresses in data.get('token_addresses', {}).items():
+            for alias, address in addresses.items():
+                db.execute(
+                    'INSERT OR REPLACE INTO tokens (user_id, alias, address) VALUES (?, ?, ?)',
+                    (int(user_id), alias, address.lower())
+                )
+    os.replace(LEGACY_DATA_FILE, LEGACY_DATA_FILE + '.migrated')
+    logger.info(f'Migrated {LEGACY_DATA_FILE} to {DATABASE_FILE}.')
+
+# Functions to save and load user data, each write only touches the changed row
+def save_address(user_id, alias, address):
+    with db:
+        db.execute('INSERT OR REPLACE INTO addresses (user_id, alias, address) VALUES (?, ?, ?)', (user_id, alias, address))
+
+def delete_address(user_id, alias):
+    with db:
+        db.execute('DELETE FROM addresses WHERE user_id = ? AND alias = ?', (user_id, alias))
+
+def set_tracked(user_id, alias, tracked, pending=False):
+    with db:
+        db.execute('UPDATE addresses SET tracked = ?, pending = ? WHERE user_id = ? AND alias = ?', (tracked, pending, user_id, alias))
+
+def save_addresses(user_id, rows, tracked):
+    """Write many (alias, address) rows in a single transaction."""
+    with db:
+        db.executemany(
+            'INSERT OR REPLACE INTO addresses (user_id, alias, address, tracked) VALUES (?, ?, ?, ?)',
+            ((user_id, alias, address, tracked) for alias, address in rows)
+        )
+
+def save_token(user_id, alias, address):
+    with db:
+        db.execute('INSERT OR REPLACE INTO tokens (user_id, alias, address) VALUES (?, ?, ?)', (user_id, alias, address))
+
+def save_alert_channel(guild_id, channel_id):
+    with db:
+        db.execute('INSERT OR REPLACE INTO guild_settings (guild_id, alert_channel_id) VALUES (?, ?)', (guild_id, channel_id))
+
+def save_watchlist(guild_id, rows):
+    """Write many (20-byte address, label) rows of a guild watchlist in a single transaction."""
+    with db:
+        db.executemany(
+            'INSERT OR REPLACE INTO guild_watchlist (guild_id, address, label) VALUES (?, ?, ?)',
+            ((guild_id, key, label) for key, label in rows)
+        )
+
+def delete_watchlist_address(guild_id, key):
+    with db:
+        return db.execute('DELETE FROM guild_watchlist WHERE guild_id = ? AND address = ?', (guild_id, key)).rowcount > 0
+
+def is_watchlisted(key):
+    return db.execute('SELECT 1 FROM guild_watchlist WHERE address = ? LIMIT 1', (key,)).fetchone() is not None
+
+def load_watchlist_subscribers(key):
+    return db.execute('SELECT guild_id, label FROM guild_watchlist WHERE address = ?', (key,)).fetchall()
+
+def count_watchlist(guild_id):
+    return db.execute('SELECT COUNT(*) FROM guild_watchlist WHERE guild_id = ?', (guild_id,)).fetchone()[0]
+
+def load_watchlist(guild_id):
+    return db.execute('SELECT address, label FROM guild_watchlist WHERE guild_id = ? ORDER BY address', (guild_id,))
+
+def load_watchlist_addresses():
+    """Every address on any guild watchlist, once."""
+    return [key for (key,) in db.execute('SELECT DISTINCT address FROM guild_watchlist')]
+
+def load_alert_channels():
+    return dict(db.execute('SELECT guild_id, alert_channel_id FROM guild_settings WHERE alert_channel_id IS NOT NULL'))
 
 def load_data():
-    try:
-        with open('user_data.json', 'r') as f:
-            data = json.load(f)
-            return data.get('user_addresses', {}), data.get('tracked_addresses', {}), data.get('token_addresses', {})
-    except FileNotFoundError:
-        return {}, {}, {}
+    migrate_legacy_data()
+    user_addresses, tracked_addresses, token_addresses = {}, {}, {}
+    for user_id, alias, address, tracked in db.execute('SELECT user_id, alias, address, tracked FROM addresses'):
+        user_addresses.setdefault(user_id, {})[alias] = address
+        if tracked:
+            tracked_addresses.setdefault(user_id, {})[alias] = address
+    for user_id, alias, address in db.execute('SELECT user_id, alias, address FROM tokens'):
+        token_addresses.setdefault(user_id, {})[alias] = address
+    return user_addresses, tracked_addresses, token_addresses
+
+def load_pending_watchers():
+    return set(db.execute('SELECT user_id, alias FROM addresses WHERE tracked AND pending'))
 
 # Load data at startup
 user_addresses, tracked_addresses, token_addresses = load_data()
+# (user_id, alias) pairs that also want alerts for pending transactions
+pending_watchers = load_pending_watchers()
+
+# Reverse index of tracked addresses: 20-byte address -> {(user_id, alias)}
+address_index = {}
+# Bumped on every change so scanner workers know when to refresh their copy
+address_index_version = 0
+
+def address_key(address):
+    """Normalize a hex address (any casing) to its raw 20 bytes."""
+    return bytes.fromhex(address[2:])
+
+def index_address(user_id, alias, address):
+    global address_index_version
+    address_index.setdefault(address_key(address), set()).add((user_id, alias))
+    address_index_version += 1
+
+def unindex_address(user_id, alias, address):
+    global address_index_version
+    address_index_version += 1
+    key = address_key(address)
+    subscribers = address_index.get(key)
+    if subscribers is None:
+        return
+    subscribers.discard((user_id, alias))
+    if not subscribers:
+        del address_index[key]
+
+def rebuild_address_index():
+    global address_index_version
+    address_index.clear()
+    address_index_version += 1
+    for user_id, addresses in tracked_addresses.items():
+        for alias, address in addresses.items():
+            index_address(user_id, alias, address)
+
+rebuild_address_index()
+
+class AddressSet:
+    """Compact set of 20-byte addresses for watchlists of up to hundreds of thousands of entries.
+
+    Each address is stored as its first 8 bytes in an open-addressing hash table
+    backed by an array('Q'), kept at most half full, so 100k addresses take 2 MB
+    and a lookup is a couple of array probes. A hit on the 8-byte prefix is only a
+    candidate, the full address is confirmed by the subscriber lookup in SQLite.
+    """
+
+    def __init__(self, keys=()):
+        self.table = array('Q', bytes(8 * 16))
+        self.count = 0
+        for key in keys:
+            self.add(key)
+
+    @staticmethod
+    def fingerprint(key):
+        # 0 marks an empty slot, so an all-zero prefix shares the fingerprint 1
+        return int.from_bytes(key[:8], 'big') or 1
+
+    def slot(self, value):
+        mask = len(self.table) - 1
+        i = value & mask
+        while self.table[i] and self.table[i] != value:
+            i = (i + 1) & mask
+        return i
+
+    def __contains__(self, key):
+        value = self.fingerprint(key)
+        return self.table[self.slot(value)] == value
+
+    def __len__(self):
+        return self.count
+
+    def add(self, key):
+        value = self.fingerprint(key)
+        i = self.slot(value)
+        if self.table[i] == value:
+            return
+        self.table[i] = value
+        self.count += 1
+        if self.count * 2 > len(self.table):
+            old = self.table
+            self.table = array('Q', bytes(16 * len(old)))
+            for value in old:
+                if value:
+                    self.table[self.slot(value)] = value
+
+    def discard(self, key):
+        value = self.fingerprint(key)
+        i = self.slot(value)
+        if self.table[i] != value:
+            return
+        # Backward shift deletion keeps every remaining entry reachable from its home slot
+        mask = len(self.table) - 1
+        self.table[i] = 0
+        self.count -= 1
+        j = i
+        while True:
+            j = (j + 1) & mask
+            if not self.table[j]:
+                break
+            home = self.table[j] & mask
+            if (i <= j and (home <= i or home > j)) or (i > j and home <= i and home > j):
+                self.table[i], self.table[j] = self.table[j], 0
+                i = j
+
+    def copy(self):
+        other = AddressSet()
+        other.table, other.count = array('Q', self.table), self.count
+        return other
+
+    def nbytes(self):
+        return self.table.itemsize * len(self.table)
+
+# Every address on any guild watchlist, subscribers are looked up in SQLite on a hit
+guild_watchlist = AddressSet(key for (key,) in db.execute('SELECT DISTINCT address FROM guild_watchlist'))
+
+def watchlist_changed():
+    global address_index_version
+    address_index_version += 1
+
+# Functions to save and load the watcher's last processed block
+def save_cursor(block_number, block_hash):
+    # Write to a temporary file first so a crash never leaves a truncated cursor
+    tmp_file = WATCHER_STATE_FILE + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump({'block_number': block_number, 'block_hash': block_hash}, f)
+    os.replace(tmp_file, WATCHER_STATE_FILE)
+
+def load_cursor():
+    try:
+        with open(WATCHER_STATE_FILE, 'r') as f:
+            data = json.load(f)
+            return data['block_number'], data['block_hash']
+    except (FileNotFoundError, KeyError, ValueError):
+        return None, None
 
 def is_valid_address(address):
     return Web3.is_address(address)
@@ -99,6 +852,222 @@ def get_witty_response():
 def format_balance(balance):
     return "{:,.2f}".format(balance)
 
+MISSING = object()
+
+class Cache:
+    """Bounded LRU cache with optional per-entry expiry and hit/miss counters."""
+
+    def __init__(self, name, maxsize, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] < time.monotonic()):
+            self.entries.pop(key, None)
+            self.misses += 1
+            return MISSING
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        self.entries[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.set(key, value, ttl)
+        return value
+
+    async def get_or_fetch(self, key, fetch, ttl=None):
+        value = self.get(key)
+        if value is MISSING:
+            value = await fetch()
+            self.set(key, value, ttl)
+        return value
+
+# Immutable data is kept until evicted, volatile RPC results expire after their TTL
+contract_cache = Cache('contracts', CONTRACT_CACHE_SIZE)
+checksum_cache = Cache('checksum addresses', CHECKSUM_CACHE_SIZE)
+token_metadata_cache = Cache('token metadata', TOKEN_METADATA_CACHE_SIZE)
+rpc_cache = Cache('rpc results', RPC_CACHE_SIZE)
+caches = [contract_cache, checksum_cache, token_metadata_cache, rpc_cache]
+
+def to_checksum(address):
+    return checksum_cache.get_or_compute(address, lambda: Web3.to_checksum_address(address))
+
+def get_contract(address, abi=None):
+    """Return a cached contract object, ERC-20 unless another parsed ABI is given."""
+    abi = abi if abi is not None else erc20_abi
+    address = to_checksum(address)
+    return contract_cache.get_or_compute((address, id(abi)), lambda: web3.eth.contract(address=address, abi=abi))
+
+# ERC-20 fields served from cache, name/symbol/decimals never change while totalSupply can
+TOKEN_FIELD_TYPES = {'name': 'string', 'symbol': 'string', 'decimals': 'uint8', 'totalSupply': 'uint256'}
+IMMUTABLE_TOKEN_FIELDS = {'name', 'symbol', 'decimals'}
+
+async def get_token_fields(contract, fields):
+    """Return the requested ERC-20 fields, only asking the node for the ones not cached."""
+    values = {}
+    missing = []
+    for field in fields:
+        cache = token_metadata_cache if field in IMMUTABLE_TOKEN_FIELDS else rpc_cache
+        value = cache.get((contract.address, field))
+        if value is MISSING:
+            missing.append(field)
+        else:
+            values[field] = value
+
+    if missing:
+        results = await multicall([(contract, field, [], TOKEN_FIELD_TYPES[field]) for field in missing], allow_failure=False)
+        for field, value in zip(missing, results):
+            if value is None:
+                raise ValueError(f'Token {contract.address} returned an undecodable {field}')
+            if field in IMMUTABLE_TOKEN_FIELDS:
+                token_metadata_cache.set((contract.address, field), value)
+            else:
+                rpc_cache.set((contract.address, field), value, TOTAL_SUPPLY_TTL)
+            values[field] = value
+    return values
+
+async def get_token_balance(contract, address):
+    return await rpc_cache.get_or_fetch(
+        (contract.address, 'balanceOf', address),
+        lambda: contract.functions.balanceOf(address).call(),
+        BALANCE_TTL
+    )
+
+# Helper function for splitting long responses into messages under Discord's 2000 character limit
+def split_message(text, limit=2000):
+    chunks = []
+    current = ''
+    for line in text.splitlines(keepends=True):
+        if current and len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ''
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+def truncate(text, limit):
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+class PagedView(discord.ui.View):
+    """Previous/next buttons over a long output, rendering each page only when it is shown.
+
+    `render_page(page)` is a coroutine returning the discord.Embed for that page,
+    so only the page on screen is ever fetched or held in memory.
+    """
+
+    def __init__(self, user_id, page_count, render_page):
+        super().__init__(timeout=PAGE_VIEW_TIMEOUT)
+        self.user_id = user_id
+        self.page_count = page_count
+        self.render_page = render_page
+        self.page = 0
+        self.message = None
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous.disabled = self.page == 0
+        self.next.disabled = self.page >= self.page_count - 1
+
+    async def turn(self, interaction, page):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message('❌ Only the user who ran this command can turn its pages.', ephemeral=True)
+            return
+        # Acknowledge first, fetching the page may take longer than Discord's interaction deadline
+        await interaction.response.defer()
+        try:
+            embed = await self.render_page(page)
+        except Exception as e:
+            logger.error(f'Failed to render page {page + 1}: {str(e)}')
+            await interaction.followup.send(f'❌ Error loading page {page + 1}: {str(e)}', ephemeral=True)
+            return
+        self.page = page
+        self.update_buttons()
+        await interaction.edit_original_response(embed=embed, view=self)
+
+    @discord.ui.button(label='Previous', style=discord.ButtonStyle.secondary, emoji='⬅️')
+    async def previous(self, interaction, button):
+        await self.turn(interaction, self.page - 1)
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.secondary, emoji='➡️')
+    async def next(self, interaction, button):
+        await self.turn(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+async def send_paged(ctx, page_count, render_page):
+    """Send the first page of a paged output right away, later pages load on demand."""
+    embed = await render_page(0)
+    if page_count <= 1:
+        await ctx.send(embed=embed)
+        return
+    view = PagedView(ctx.author.id, page_count, render_page)
+    view.message = await ctx.send(embed=embed, view=view)
+
+multicall_limit = asyncio.Semaphore(MULTICALL_CONCURRENCY)
+
+def encode_multicall_batch(multicall_contract, calls, allow_failure):
+    """Return the aggregate3 calldata for a batch of calls."""
+    encoded = [
+        (contract.address, allow_failure, contract.encodeABI(fn_name=fn_name, args=args))
+        for contract, fn_name, args, _ in calls
+    ]
+    return multicall_contract.encodeABI(fn_name='aggregate3', args=[encoded])
+
+def decode_multicall_batch(calls, return_data):
+    results = []
+    for (_, _, _, output_type), (success, return_data) in zip(calls, web3.codec.decode(['(bool,bytes)[]'], return_data)[0]):
+        value = None
+        if success and return_data:
+            try:
+                value = web3.codec.decode([output_type], return_data)[0]
+            except Exception:
+                # Non-standard return data, e.g. a bytes32 symbol
+                pass
+        results.append(value)
+    return results
+
+async def multicall(calls, allow_failure=True):
+    """Run many read-only contract calls through Multicall3's aggregate3.
+
+    `calls` is a list of (contract, fn_name, args, output_type) tuples. Calls are
+    packed MULTICALL_BATCH_SIZE per eth_call, with at most MULTICALL_CONCURRENCY
+    batches in flight. ABI encoding and decoding run in the default executor, a
+    few thousand calls would otherwise block the event loop for seconds.
+    Returns the decoded value of each call, or None for calls that failed when
+    allow_failure is set.
+    """
+    multicall_contract = get_contract(MULTICALL3_ADDRESS, multicall3_abi)
+    loop = asyncio.get_running_loop()
+
+    async def run_batch(batch):
+        async with multicall_limit:
+            data = await loop.run_in_executor(None, encode_multicall_batch, multicall_contract, batch, allow_failure)
+            return_data = await web3.eth.call({'to': multicall_contract.address, 'data': data})
+        return await loop.run_in_executor(None, decode_multicall_batch, batch, return_data)
+
+    batches = [calls[i:i + MULTICALL_BATCH_SIZE] for i in range(0, len(calls), MULTICALL_BATCH_SIZE)]
+    return list(itertools.chain.from_iterable(await asyncio.gather(*(run_batch(batch) for batch in batches))))
+
 @bot.command(name='add', help='➕ Adds an Ethereum address to track with an alias. \nUsage: !add myWallet 0x742d35Cc6634C0532925a3b844Bc454e4438f44e')
 async def add_address(ctx, alias: str, address: str):
     logger.info(f'add_address was called with alias: {alias} and address: {address}')
@@ -106,17 +1075,21 @@ async def add_address(ctx, alias: str, address: str):
     if user_id not in user_addresses:
         user_addresses[user_id] = {}
 
-    if len(user_addresses[user_id]) >= 10:
-        await ctx.send('❗ You have reached the maximum limit of 10 addresses.')
+    if len(user_addresses[user_id]) >= MAX_USER_ADDRESSES:
+        await ctx.send(f'❗ You have reached the maximum limit of {MAX_USER_ADDRESSES} addresses.')
         return
 
     if alias in user_addresses[user_id]:
         await ctx.send('❌ This alias is already in use. Please choose a different alias.')
         return
 
+    if len(alias) > MAX_ALIAS_LENGTH:
+        await ctx.send(f'❌ Aliases are limited to {MAX_ALIAS_LENGTH} characters. Please choose a shorter alias.')
+        return
+
     if is_valid_address(address):
         user_addresses[user_id][alias] = address.lower()
-        save_data()
+        save_address(user_id, alias, address.lower())
         await ctx.send(f'{get_witty_response()}\n✅ Address `{address}` with alias `{alias}` added. Use `!watch {alias}` to start tracking transactions.')
         logger.info(f'User {ctx.author.name} added address {address} with alias {alias}.')
     else:
@@ -126,7 +1099,7 @@ async def add_address(ctx, alias: str, address: str):
 @bot.command(name='latest_block', help='🔢 Get the latest block number.')
 async def get_latest_block(ctx):
     try:
-        latest_block = web3.eth.block_number
+        latest_block = await rpc_cache.get_or_fetch('block_number', lambda: web3.eth.block_number, BLOCK_NUMBER_TTL)
         await ctx.send(f'✅ The latest block number is: {latest_block}.')
     except Exception as e:
         await ctx.send(f'❌ Error getting latest block number: {str(e)}')
@@ -141,9 +1114,9 @@ async def get_transaction_count(ctx, alias: str):
         return
 
     address = user_addresses[user_id][alias]
-    checksum_address = Web3.to_checksum_address(address)
+    checksum_address = to_checksum(address)
     try:
-        tx_count = web3.eth.get_transaction_count(checksum_address)
+        tx_count = await web3.eth.get_transaction_count(checksum_address)
         await ctx.send(f'✅ The number of transactions sent from address `{checksum_address}` (alias: `{alias}`) is: {tx_count}.')
     except Exception as e:
         await ctx.send(f'❌ Error getting transaction count: {str(e)}')
@@ -152,8 +1125,34 @@ async def get_transaction_count(ctx, alias: str):
 @bot.command(name='transaction_receipt', help='🧾 Get the receipt of a transaction. \nUsage: !transaction_receipt 0xTransactionHash')
 async def get_transaction_receipt(ctx, tx_hash: str):
     try:
-        receipt = web3.eth.get_transaction_receipt(tx_hash)
-        await ctx.send(f'✅ Transaction receipt for {tx_hash}:\n\n{receipt}.')
+        receipt = await web3.eth.get_transaction_receipt(tx_hash)
+        logs = receipt['logs']
+        log_pages = (len(logs) + RECEIPT_LOGS_PAGE_SIZE - 1) // RECEIPT_LOGS_PAGE_SIZE
+
+        async def render_page(page):
+            embed = discord.Embed(title='🧾 Transaction receipt', description=f'`{tx_hash}`', url=f'https://etherscan.io/tx/{tx_hash}')
+            embed.set_footer(text=f'Page {page + 1}/{log_pages + 1}')
+            if page == 0:
+                fee = receipt['gasUsed'] * receipt['effectiveGasPrice']
+                embed.add_field(name='Status', value='✅ Success' if receipt['status'] == 1 else '❌ Failed')
+                embed.add_field(name='Block', value=str(receipt['blockNumber']))
+                embed.add_field(name='Logs', value=str(len(logs)))
+                embed.add_field(name='From', value=f'`{receipt["from"]}`', inline=False)
+                embed.add_field(name='To', value=f'`{receipt["to"]}`' if receipt['to'] else f'Contract created at `{receipt["contractAddress"]}`', inline=False)
+                embed.add_field(name='Gas Used', value=f'{receipt["gasUsed"]:,}')
+                embed.add_field(name='Gas Price', value=f'{web3.from_wei(receipt["effectiveGasPrice"], "gwei")} Gwei')
+                embed.add_field(name='Fee', value=f'{format_balance(web3.from_wei(fee, "ether"))} ETH')
+                return embed
+            start = (page - 1) * RECEIPT_LOGS_PAGE_SIZE
+            for log in logs[start:start + RECEIPT_LOGS_PAGE_SIZE]:
+                topics = '\n'.join(f'`{topic.hex()}`' for topic in log['topics'])
+                value = f'Address: `{log["address"]}`\nTopics:\n{topics}\nData: '
+                # Long calldata-style payloads are cut to fit the field
+                value += f'`{truncate(log["data"].hex(), EMBED_FIELD_LIMIT - len(value) - 2)}`'
+                embed.add_field(name=f'Log {log["logIndex"]}', value=value, inline=False)
+            return embed
+
+        await send_paged(ctx, log_pages + 1, render_page)
     except Exception as e:
         await ctx.send(f'❌ Error getting transaction receipt: {str(e)}')
         logger.error(f'Error getting transaction receipt: {str(e)}')
@@ -167,10 +1166,10 @@ async def estimate_gas(ctx, alias: str, to: str, value: str):
         return
 
     from_address = user_addresses[user_id][alias]
-    checksum_from_address = Web3.to_checksum_address(from_address)
+    checksum_from_address = to_checksum(from_address)
     checksum_to_address = Web3.to_checksum_address(to)
     try:
-        gas_estimate = web3.eth.estimate_gas({
+        gas_estimate = await web3.eth.estimate_gas({
             "from": checksum_from_address,
             "to": checksum_to_address,
             "value": web3.to_wei(value, 'ether')
@@ -187,9 +1186,15 @@ async def estimate_gas(ctx, alias: str, to: str, value: str):
 async def check_network_status(ctx):
     try:
         # Check if the bot is connected to the Ethereum network
-        if web3.isConnected():
-            # If connected, send a confirmation message to the user
-            await ctx.send('✅ Connected to the Ethereum network.')
+        if await web3.is_connected():
+            # If connected, send a confirmation message to the user, along with the health of each endpoint
+            lines = ['✅ Connected to the Ethereum network.']
+            now = time.monotonic()
+            for endpoint in rpc_pool.endpoints:
+                latency = f'{endpoint.latency * 1000:.0f}ms' if endpoint.latency is not None else 'n/a'
+                status = '🧊 cooling down' if endpoint.cooldown_until > now else '🟢'
+                lines.append(f'{status} `{endpoint}`: {latency} latency, {endpoint.error_rate:.0%} errors, {endpoint.requests} requests')
+            await ctx.send('\n'.join(lines))
         else:
             # If not connected, send an error message to the user
             await ctx.send('❌ Not connected to the Ethereum network.')
@@ -208,9 +1213,9 @@ async def add_token_address(ctx, alias: str, address: str):
     if user_id not in token_addresses:
         token_addresses[user_id] = {}
 
-    # Check if the user already has 10 token addresses, which is the limit
-    if len(token_addresses[user_id]) >= 10:
-        await ctx.send('❗ You have reached the maximum limit of 10 token addresses.')
+    # Check if the user already has the maximum number of token addresses
+    if len(token_addresses[user_id]) >= MAX_USER_TOKENS:
+        await ctx.send(f'❗ You have reached the maximum limit of {MAX_USER_TOKENS} token addresses.')
         return
 
     # Check if the alias is already in use
@@ -222,7 +1227,7 @@ async def add_token_address(ctx, alias: str, address: str):
     if is_valid_address(address):
         # Save the address and alias to the token_addresses dictionary and save the data
         token_addresses[user_id][alias] = address.lower()
-        save_data()
+        save_token(user_id, alias, address.lower())
 
         # Send a confirmation message to the user
         await ctx.send(f'✅ Token contract address `{address}` with alias `{alias}` added.')
@@ -248,8 +1253,9 @@ async def remove_address(ctx, alias: str):
         # If it does, remove the address and alias from the user_addresses dictionary and save the data
         removed_address = user_addresses[user_id].pop(alias)
         if user_id in tracked_addresses and alias in tracked_addresses[user_id]:
-            tracked_addresses[user_id].pop(alias)
-            save_data()
+            unindex_address(user_id, alias, tracked_addresses[user_id].pop(alias))
+        pending_watchers.discard((user_id, alias))
+        delete_address(user_id, alias)
         # Send a confirmation message to the user
         await ctx.send(f'{get_witty_response()}\n✅ Address `{removed_address}` with alias `{alias}` removed.')
     else:
@@ -267,14 +1273,19 @@ async def list_addresses(ctx):
         await ctx.send('❗ No addresses to display.')
         return
 
-    # Create a response string with all the user's addresses and their tracking status
-    response = 'Your addresses:\\n\\n'
-    for alias, address in user_addresses[user_id].items():
-        tracking_status = "👀✅" if user_id in tracked_addresses and alias in tracked_addresses[user_id] else "❌"
-        response += f'{alias}: `{address}` {tracking_status}\\n'
+    # One line per address with its tracking status, LIST_PAGE_SIZE lines per page
+    addresses = list(user_addresses[user_id].items())
+    tracked = tracked_addresses.get(user_id, {})
+    page_count = (len(addresses) + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
 
-    # Send the response to the user
-    await ctx.send(response)
+    async def render_page(page):
+        start = page * LIST_PAGE_SIZE
+        lines = [f'{alias}: `{address}` {"👀✅" if alias in tracked else "❌"}' for alias, address in addresses[start:start + LIST_PAGE_SIZE]]
+        embed = discord.Embed(title='📜 Your addresses', description=truncate('\n'.join(lines), EMBED_DESCRIPTION_LIMIT))
+        embed.set_footer(text=f'Page {page + 1}/{page_count} · {len(tracked)} of {len(addresses)} tracked')
+        return embed
+
+    await send_paged(ctx, page_count, render_page)
 
 # Define a new bot command to list all the user's added token contract addresses
 @bot.command(name='tokens', help='📜 Lists all your added token contract addresses.')
@@ -287,26 +1298,128 @@ async def list_tokens(ctx):
         await ctx.send('❗ No token contract addresses to display.')
         return
 
-    response = 'Your token contract addresses:\n\n'
-    for alias, address in token_addresses[user_id].items():
-        response += f'{alias}: `{address}`\n'
+    tokens = list(token_addresses[user_id].items())
+    page_count = (len(tokens) + LIST_PAGE_SIZE - 1) // LIST_PAGE_SIZE
+
+    async def render_page(page):
+        start = page * LIST_PAGE_SIZE
+        lines = [f'{alias}: `{address}`' for alias, address in tokens[start:start + LIST_PAGE_SIZE]]
+        embed = discord.Embed(title='📜 Your token contract addresses', description=truncate('\n'.join(lines), EMBED_DESCRIPTION_LIMIT))
+        embed.set_footer(text=f'Page {page + 1}/{page_count}')
+        return embed
+
+    await send_paged(ctx, page_count, render_page)
+
+async def read_csv_attachment(ctx):
+    """Return the rows of the CSV file attached to the command, or None after telling the user what is wrong."""
+    if not ctx.message.attachments:
+        await ctx.send('❗ Please attach a .csv file.')
+        return None
+    attachment = ctx.message.attachments[0]
+    if attachment.size > MAX_IMPORT_BYTES:
+        await ctx.send(f'❌ The file is too large, the limit is {MAX_IMPORT_BYTES // (1024 * 1024)} MB.')
+        return None
+    try:
+        text = (await attachment.read()).decode('utf-8-sig')
+    except (discord.HTTPException, UnicodeDecodeError) as e:
+        await ctx.send(f'❌ Failed to read the attachment: {str(e)}')
+        return None
+    rows = []
+    for index, row in enumerate(csv.reader(io.StringIO(text))):
+        if index % IMPORT_CHUNK_SIZE == 0:
+            await asyncio.sleep(0)
+        # Tuples of strings drop out of garbage collection, so huge files don't slow every collection
+        row = tuple([field.strip() for field in row])
+        if any(row):
+            rows.append(row)
+    return rows
+
+def csv_file(rows, filename):
+    output = io.StringIO()
+    csv.writer(output).writerows(rows)
+    return discord.File(io.BytesIO(output.getvalue().encode()), filename=filename)
+
+@bot.command(name='import', help='📥 Adds addresses from an attached CSV file of alias,address (or just address) rows. Add --watch to start tracking them. \nUsage: !import [--watch] with a .csv attachment')
+async def import_addresses(ctx, mode: str = None):
+    logger.info(f'import_addresses was called with mode: {mode}')
+    if mode not in (None, '--watch'):
+        await ctx.send('❌ Invalid option. Use `!import` or `!import --watch`.')
+        return
+    rows = await read_csv_attachment(ctx)
+    if rows is None:
+        return
 
-    await ctx.send(response)
+    user_id = ctx.author.id
+    addresses = user_addresses.setdefault(user_id, {})
+    imported = {}
+    skipped = 0
+    for index, row in enumerate(rows):
+        if index % IMPORT_CHUNK_SIZE == 0:
+            await asyncio.sleep(0)
+        alias, address = (row[0], row[1]) if len(row) > 1 else (None, row[0])
+        if not is_valid_address(address):
+            # Also skips a header row
+            skipped += 1
+            continue
+        address = address.lower()
+        alias = alias or address
+        if len(alias) > MAX_ALIAS_LENGTH or alias in addresses or alias in imported or len(addresses) + len(imported) >= MAX_USER_ADDRESSES:
+            skipped += 1
+            continue
+        imported[alias] = address
+
+    watch = mode == '--watch'
+    imported = list(imported.items())
+    for start in range(0, len(imported), IMPORT_CHUNK_SIZE):
+        chunk = imported[start:start + IMPORT_CHUNK_SIZE]
+        save_addresses(user_id, chunk, watch)
+        addresses.update(chunk)
+        if watch:
+            tracked_addresses.setdefault(user_id, {}).update(chunk)
+            for alias, address in chunk:
+                index_address(user_id, alias, address)
+        await asyncio.sleep(0)
+    logger.info(f'User {ctx.author.name} imported {len(imported)} addresses, skipped {skipped}.')
+    watch_note = ' and started tracking them' if watch else '. Use `!watch` to start tracking them'
+    msg = f'✅ Imported {len(imported)} addresses{watch_note}.'
+    if skipped:
+        msg += f'\n❗ Skipped {skipped} rows with an invalid address, an alias longer than {MAX_ALIAS_LENGTH} characters or already in use, or over the limit of {MAX_USER_ADDRESSES}.'
+    await ctx.send(msg)
+
+@bot.command(name='export', help='📤 Sends your addresses as a CSV file that !import accepts.')
+async def export_addresses(ctx):
+    logger.info('export_addresses was called')
+    addresses = user_addresses.get(ctx.author.id)
+    if not addresses:
+        await ctx.send('❗ No addresses to export.')
+        return
+    await ctx.send(f'📤 Your {len(addresses)} addresses:', file=csv_file(addresses.items(), 'addresses.csv'))
 
-@bot.command(name='watch', help='👀 Starts tracking transactions for an Ethereum address by its alias. \nUsage: !watch myWallet')
-async def track_address(ctx, alias: str):
-    logger.info(f'track_address was called with alias: {alias}')
+@bot.command(name='watch', help='👀 Starts tracking transactions for an Ethereum address by its alias. Add --pending to also get alerts while transactions are still in the mempool. \nUsage: !watch myWallet [--pending]')
+async def track_address(ctx, alias: str, mode: str = None):
+    logger.info(f'track_address was called with alias: {alias} and mode: {mode}')
     user_id = ctx.author.id
     if user_id not in user_addresses or alias not in user_addresses[user_id]:
         await ctx.send('❌ Invalid alias. Please add the address first.')
         return
 
+    if mode not in (None, '--pending'):
+        await ctx.send('❌ Invalid option. Use `!watch myWallet` or `!watch myWallet --pending`.')
+        return
+    pending = mode == '--pending'
+
     if user_id not in tracked_addresses:
         tracked_addresses[user_id] = {}
-        save_data()
 
     tracked_addresses[user_id][alias] = user_addresses[user_id][alias]
-    await ctx.send(f'{get_witty_response()}\n✅ Started tracking transactions for address with alias `{alias}`.')
+    index_address(user_id, alias, tracked_addresses[user_id][alias])
+    if pending:
+        pending_watchers.add((user_id, alias))
+    else:
+        pending_watchers.discard((user_id, alias))
+    set_tracked(user_id, alias, True, pending)
+    pending_note = ', including pending transactions' if pending else ''
+    await ctx.send(f'{get_witty_response()}\n✅ Started tracking transactions for address with alias `{alias}`{pending_note}.')
 
 @bot.command(name='tokeninfo', help='💰 Get information about a specific ERC20 token. \nUsage: !tokeninfo myToken')
 async def get_token_info(ctx, token_alias: str):
@@ -317,11 +1430,10 @@ async def get_token_info(ctx, token_alias: str):
         return
 
     contract_address = token_addresses[user_id][token_alias]
-    contract = web3.eth.contract(address=contract_address, abi=erc20_abi)
+    contract = get_contract(contract_address)
     try:
-        token_name = contract.functions.name().call()
-        token_symbol = contract.functions.symbol().call()
-        total_supply = contract.functions.totalSupply().call()
+        token_fields = await get_token_fields(contract, ['name', 'symbol', 'totalSupply'])
+        token_name, token_symbol, total_supply = token_fields['name'], token_fields['symbol'], token_fields['totalSupply']
         await ctx.send(f'✅ Info for token with contract address `{contract_address}` (alias: `{token_alias}`):\nName: {token_name}\nSymbol: {token_symbol}\nTotal supply: {total_supply}.')
     except Exception as e:
         await ctx.send(f'❌ Error getting token info: {str(e)}')
@@ -335,7 +1447,9 @@ async def stop_tracking(ctx, alias: str):
         await ctx.send('❌ Invalid alias. Please check the addresses you are tracking.')
         return
 
-    tracked_addresses[user_id].pop(alias)
+    unindex_address(user_id, alias, tracked_addresses[user_id].pop(alias))
+    pending_watchers.discard((user_id, alias))
+    set_tracked(user_id, alias, False)
     await ctx.send(f'{get_witty_response()}\n✅ Stopped tracking transactions for address with alias `{alias}`.')
 
 @bot.command(name='tokenbalance', help='💰 Checks the balance of a specific ERC20 token for an Ethereum address. \\nUsage: !tokenbalance myWallet myToken')
@@ -354,26 +1468,26 @@ async def check_token_balance(ctx, address_alias: str, token_alias: str):
         return
 
     address = user_addresses[user_id][address_alias]
-    checksum_address = Web3.to_checksum_address(address)
+    checksum_address = to_checksum(address)
     logger.info(f'Using address {checksum_address} for balance check.')
 
     contract_address = token_addresses[user_id][token_alias]
-    checksum_contract_address = Web3.to_checksum_address(contract_address)
+    checksum_contract_address = to_checksum(contract_address)
     logger.info(f'Using contract address {checksum_contract_address} for balance check.')
 
     try:
-        # Create a contract object
-        token_contract = web3.eth.contract(address=checksum_contract_address, abi=erc20_abi)
+        # Get the (cached) contract object
+        token_contract = get_contract(checksum_contract_address)
 
         # Call the balanceOf function and get the token balance
-        token_balance = token_contract.functions.balanceOf(checksum_address).call()
+        token_balance = await get_token_balance(token_contract, checksum_address)
 
         # Format the token balance
         formatted_token_balance = format_balance(token_balance)
 
         # Send the response with the token balance
         await ctx.send(f'✅ Balance of token with contract address `{checksum_contract_address}` (alias: `{token_alias}`) for address `{checksum_address}` (alias: `{address_alias}`): {formatted_token_balance}.')
-    except web3.exceptions.CannotHandleRequest as e:
+    except CannotHandleRequest as e:
         await ctx.send(f'❌ Error connecting to the Ethereum network: {str(e)}')
         logger.error(f'Error connecting to the Ethereum network: {str(e)}')
     except Exception as e:
@@ -384,21 +1498,21 @@ async def check_token_balance(ctx, address_alias: str, token_alias: str):
 async def simplified_check_token_balance(ctx, eth_address: str, token_contract_address: str):
     try:
         # Convert input addresses to checksum addresses
-        checksum_eth_address = Web3.to_checksum_address(eth_address)
-        checksum_token_contract_address = Web3.to_checksum_address(token_contract_address)
+        checksum_eth_address = to_checksum(eth_address)
+        checksum_token_contract_address = to_checksum(token_contract_address)
 
-        # Create a contract object
-        token_contract = web3.eth.contract(address=checksum_token_contract_address, abi=erc20_abi)
+        # Get the (cached) contract object
+        token_contract = get_contract(checksum_token_contract_address)
 
         # Call the balanceOf function and get the token balance
-        token_balance = token_contract.functions.balanceOf(checksum_eth_address).call()
+        token_balance = await get_token_balance(token_contract, checksum_eth_address)
 
         # Format the token balance
         formatted_token_balance = format_balance(token_balance)
 
         # Send the response with the token balance
         await ctx.send(f'✅ Balance of token with contract address `{checksum_token_contract_address}` for address `{checksum_eth_address}`: {formatted_token_balance}.')
-    except web3.exceptions.CannotHandleRequest as e:
+    except CannotHandleRequest as e:
         await ctx.send(f'❌ Error connecting to the Ethereum network: {str(e)}')
         logger.error(f'Error connecting to the Ethereum network: {str(e)}')
     except Exception as e:
@@ -411,19 +1525,192 @@ async def simplified_check_token_balance(ctx, eth_address: str, token_contract_a
 async def get_block_transactions(ctx, block_number: int):
     logger.info(f'get_block_transactions was called with block_number: {block_number}')
     try:
-        block = web3.eth.get_block(block_number, full_transactions=True)
-        if not block['transactions']:
+        # Only the hashes up front, each page fetches its own transactions
+        block = await web3.eth.get_block(block_number)
+        tx_hashes = block['transactions']
+        if not tx_hashes:
             await ctx.send('❌ No transactions in this block.')
             return
+        page_count = (len(tx_hashes) + BLOCK_TX_PAGE_SIZE - 1) // BLOCK_TX_PAGE_SIZE
+
+        async def render_page(page):
+            start = page * BLOCK_TX_PAGE_SIZE
+            transactions = await batch_get_transactions(tx_hashes[start:start + BLOCK_TX_PAGE_SIZE])
+            embed = discord.Embed(title=f'📜 Transactions in block {block_number}', description=f'{len(tx_hashes)} transactions')
+            embed.set_footer(text=f'Page {page + 1}/{page_count}')
+            for tx in transactions:
+                recipient = f'`{tx["to"]}`' if tx['to'] else 'Contract creation'
+                embed.add_field(
+                    name=f'#{tx["transactionIndex"]} {tx["hash"].hex()}',
+                    value=f'From: `{tx["from"]}`\nTo: {recipient}\nValue: {format_balance(web3.from_wei(tx["value"], "ether"))} ETH',
+                    inline=False
+                )
+            return embed
+
+        await send_paged(ctx, page_count, render_page)
+    except Exception as e:
+        await ctx.send(f'❌ Error getting transactions: {str(e)}')
+        logger.error(f'Failed to get transactions for block_number: {block_number}. Error: {str(e)}')
 
-        response = f'Transactions in block `{block_number}`:\n\n'
+# Shared by every running scan so several users can't multiply the RPC load
+history_request_limit = asyncio.Semaphore(HISTORY_CONCURRENCY)
+
+async def scan_history_chunk(key, start, end):
+    """Return the lines for transactions and token transfers of one address in blocks start..end."""
+    topic = address_topic(key)
+    address = '0x' + key.hex()
+
+    async def get_blocks(numbers):
+        # Raw batched blocks, web3's result formatting costs more than the request itself
+        async with history_request_limit:
+            return await rpc_batch([("eth_getBlockByNumber", [hex(number), True]) for number in numbers])
+
+    async def get_logs(topic_filter):
+        async with history_request_limit:
+            return await web3.eth.get_logs({'fromBlock': start, 'toBlock': end, 'topics': topic_filter})
+
+    numbers = list(range(start, end + 1))
+    block_batches, sent_logs, received_logs = await asyncio.gather(
+        asyncio.gather(*(get_blocks(numbers[i:i + HISTORY_BLOCKS_PER_REQUEST]) for i in range(0, len(numbers), HISTORY_BLOCKS_PER_REQUEST))),
+        get_logs([TRANSFER_TOPIC, topic]),
+        get_logs([TRANSFER_TOPIC, None, topic])
+    )
+
+    lines = []
+    for block in itertools.chain.from_iterable(block_batches):
+        # A lagging endpoint may not have the newest blocks yet
+        if block is None:
+            continue
+        block_number = int(block['number'], 16)
         for tx in block['transactions']:
-            response += f'From: `{tx["from"]}`\nTo: `{tx["to"]}`\nValue: {web3.fromWei(tx["value"], "ether")} ETH\nHash: `{tx["hash"].hex()}`\n\n'
+            sender, recipient = tx['from'].lower(), (tx['to'] or '').lower()
+            if address not in (sender, recipient):
+                continue
+            value = format_balance(web3.from_wei(int(tx['value'], 16), 'ether'))
+            direction = f"📥 from `{to_checksum(sender)}`" if recipient == address else f"📤 to `{to_checksum(recipient) if recipient else 'contract creation'}`"
+            lines.append((block_number, int(tx['transactionIndex'], 16), f"Block {block_number}: {value} ETH {direction} (`{tx['hash']}`)"))
+
+    logs = {(log['transactionHash'], log['logIndex']): log for log in sent_logs + received_logs}
+    transfers = [(log, decode_transfer_log(log)) for log in logs.values()]
+    transfers = [(log, transfer) for log, transfer in transfers if transfer]
+    tokens = list({transfer['token'] for _, transfer in transfers})
+    metadata = dict(zip(tokens, await asyncio.gather(*(get_token_metadata(token) for token in tokens))))
+    for log, transfer in transfers:
+        symbol, decimals = metadata[transfer['token']]
+        amount = format_balance(Decimal(transfer['value']) / Decimal(10) ** decimals)
+        direction = f"📥 from `{transfer['from']}`" if address_key(transfer['to']) == key else f"📤 to `{transfer['to']}`"
+        lines.append((log['blockNumber'], log['transactionIndex'], f"Block {log['blockNumber']}: {amount} {symbol} {direction} (`{transfer['hash']}`)"))
+
+    return [line for _, _, line in sorted(lines, key=lambda line: line[:2])]
+
+async def scan_history(key, from_block, to_block):
+    """Scan a block range in chunks with a bounded pool of workers, yielding each chunk's lines in order."""
+    ranges = iter([(start, min(start + HISTORY_CHUNK_SIZE - 1, to_block)) for start in range(from_block, to_block + 1, HISTORY_CHUNK_SIZE)])
+    in_flight = deque()
+    try:
+        # Keep HISTORY_WORKERS chunks running ahead while results are handed out in order
+        for start, end in itertools.islice(ranges, HISTORY_WORKERS):
+            in_flight.append((end, asyncio.create_task(scan_history_chunk(key, start, end))))
+        while in_flight:
+            end, task = in_flight.popleft()
+            lines = await task
+            for start, next_end in itertools.islice(ranges, 1):
+                in_flight.append((next_end, asyncio.create_task(scan_history_chunk(key, start, next_end))))
+            yield end, lines
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+
+# User id -> running history scan task (None while it starts), one scan per user at a time
+history_scans = {}
+
+class HistoryCancelView(discord.ui.View):
+    def __init__(self, user_id):
+        super().__init__(timeout=None)
+        self.user_id = user_id
+
+    @discord.ui.button(label='Cancel', style=discord.ButtonStyle.danger, emoji='⛔')
+    async def cancel(self, interaction, button):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message('❌ Only the user who started this scan can cancel it.', ephemeral=True)
+            return
+        scan = history_scans.get(self.user_id)
+        if scan:
+            scan.cancel()
+        await interaction.response.defer()
+
+@bot.command(name='history', help='🕰️ Lists the transactions and token transfers of an address in a range of blocks. \nUsage: !history myWallet 19000000 19010000')
+async def get_history(ctx, alias: str, from_block: int, to_block: int):
+    logger.info(f'get_history was called with alias: {alias}, from_block: {from_block} and to_block: {to_block}')
+    user_id = ctx.author.id
+    if user_id not in user_addresses or alias not in user_addresses[user_id]:
+        await ctx.send('❌ Invalid alias. Please try again.')
+        return
+
+    if from_block < 0 or from_block > to_block or to_block - from_block + 1 > HISTORY_MAX_BLOCKS:
+        await ctx.send(f'❌ Invalid block range. Scans are limited to {HISTORY_MAX_BLOCKS} blocks.')
+        return
+
+    if user_id in history_scans:
+        await ctx.send('❗ You already have a history scan running. Cancel it first.')
+        return
+    if len(history_scans) >= HISTORY_MAX_SCANS:
+        await ctx.send('❗ Too many history scans are running right now. Please try again later.')
+        return
 
-        await ctx.send(response)
+    # Claim the slot before the first await so a repeated command can't start a second scan
+    history_scans[user_id] = None
+    try:
+        await run_history_scan(ctx, alias, from_block, to_block)
+    finally:
+        history_scans.pop(user_id, None)
+
+async def run_history_scan(ctx, alias, from_block, to_block):
+    user_id = ctx.author.id
+    try:
+        latest_block = await rpc_cache.get_or_fetch('block_number', lambda: web3.eth.block_number, BLOCK_NUMBER_TTL)
     except Exception as e:
-        await ctx.send(f'❌ Error getting transactions: {str(e)}')
-        logger.error(f'Failed to get transactions for block_number: {block_number}. Error: {str(e)}')
+        await ctx.send(f'❌ Error getting latest block number: {str(e)}')
+        return
+    if from_block > latest_block:
+        await ctx.send(f'❌ Block {from_block} has not been mined yet, the latest block is {latest_block}.')
+        return
+    if to_block > latest_block:
+        await ctx.send(f'❗ The latest block is {latest_block}, scanning up to it.')
+        to_block = latest_block
+
+    key = address_key(user_addresses[user_id][alias])
+    total = to_block - from_block + 1
+    view = HistoryCancelView(user_id)
+    progress = await ctx.send(f'🔎 Scanning blocks {from_block}-{to_block} for `{alias}`: 0%', view=view)
+    found = 0
+    scanned_to = from_block - 1
+
+    async def run():
+        nonlocal found, scanned_to
+        last_update = time.monotonic()
+        async for end, lines in scan_history(key, from_block, to_block):
+            scanned_to = end
+            found += len(lines)
+            # Stream each chunk's matches as soon as everything before it is done
+            for chunk in split_message('\n'.join(lines)):
+                await ctx.send(chunk)
+            if time.monotonic() - last_update >= HISTORY_PROGRESS_INTERVAL:
+                last_update = time.monotonic()
+                percent = (end - from_block + 1) * 100 // total
+                await progress.edit(content=f'🔎 Scanning blocks {from_block}-{to_block} for `{alias}`: {percent}% ({found} found so far)')
+
+    history_scans[user_id] = asyncio.create_task(run())
+    try:
+        await history_scans[user_id]
+        await progress.edit(content=f'✅ Scanned blocks {from_block}-{to_block} for `{alias}`: {found} found.', view=None)
+    except asyncio.CancelledError:
+        await progress.edit(content=f'⛔ History scan for `{alias}` cancelled after block {scanned_to} ({found} found).', view=None)
+    except Exception as e:
+        await progress.edit(content=f'❌ Error scanning history: {str(e)}', view=None)
+        logger.error(f'Error scanning history for alias {alias}: {str(e)}')
+    finally:
+        view.stop()
 
 @bot.command(name='balance', help='💰 Checks the balance of an Ethereum address by its alias. \nUsage: !balance myWallet')
 async def check_balance(ctx, alias: str):
@@ -436,11 +1723,11 @@ async def check_balance(ctx, alias: str):
         return
 
     address = user_addresses[user_id][alias]
-    checksum_address = Web3.to_checksum_address(address)
+    checksum_address = to_checksum(address)
     logger.info(f'Using address {checksum_address} for balance check.')
 
     try:
-        balance = web3.eth.get_balance(checksum_address)
+        balance = await rpc_cache.get_or_fetch(('balance', checksum_address), lambda: web3.eth.get_balance(checksum_address), BALANCE_TTL)
         eth_balance = web3.from_wei(balance, 'ether')
         await ctx.send(f'{get_witty_response()}\n✅ Balance of address `{checksum_address}` (alias: `{alias}`): {format_balance(eth_balance)} ETH.')
         logger.info(f'Balance check successful. Balance: {eth_balance} ETH.')
@@ -448,17 +1735,290 @@ async def check_balance(ctx, alias: str):
         await ctx.send(f'❌ Error checking balance: {str(e)}')
         logger.error(f'Error checking balance: {str(e)}')
         
+@bot.command(name='portfolio', help='📊 Shows the ETH and token balances of all your addresses, a page of addresses at a time. \nUsage: !portfolio')
+async def get_portfolio(ctx):
+    logger.info('get_portfolio was called')
+    user_id = ctx.author.id
+    if user_id not in user_addresses or not user_addresses[user_id]:
+        await ctx.send('❗ No addresses to display.')
+        return
+
+    multicall_contract = get_contract(MULTICALL3_ADDRESS, multicall3_abi)
+    addresses = [(alias, to_checksum(address)) for alias, address in user_addresses[user_id].items()]
+    tokens = {alias: get_contract(address) for alias, address in token_addresses.get(user_id, {}).items()}
+    # Each page holds as many addresses as fit in PORTFOLIO_MAX_CALLS balance calls
+    page_size = max(1, PORTFOLIO_MAX_CALLS // (len(tokens) + 1))
+    page_count = (len(addresses) + page_size - 1) // page_size
+
+    # Missing token metadata is fetched once, balances page by page as they are shown
+    unknown_tokens = [
+        contract for contract in tokens.values()
+        if token_metadata_cache.get((contract.address, 'symbol')) is MISSING
+        or token_metadata_cache.get((contract.address, 'decimals')) is MISSING
+    ]
+    calls = []
+    for contract in unknown_tokens:
+        calls.append((contract, 'symbol', [], 'string'))
+        calls.append((contract, 'decimals', [], 'uint8'))
+    try:
+        results = iter(await multicall(calls))
+    except Exception as e:
+        await ctx.send(f'❌ Error getting portfolio: {str(e)}')
+        logger.error(f'Error getting portfolio: {str(e)}')
+        return
+    for contract in unknown_tokens:
+        symbol, decimals = next(results), next(results)
+        if symbol is not None and decimals is not None:
+            token_metadata_cache.set((contract.address, 'symbol'), symbol)
+            token_metadata_cache.set((contract.address, 'decimals'), decimals)
+
+    async def render_page(page):
+        page_addresses = addresses[page * page_size:(page + 1) * page_size]
+        calls = []
+        for _, address in page_addresses:
+            calls.append((multicall_contract, 'getEthBalance', [address], 'uint256'))
+            for contract in tokens.values():
+                calls.append((contract, 'balanceOf', [address], 'uint256'))
+        results = iter(await multicall(calls))
+
+        response = ''
+        for alias, address in page_addresses:
+            eth_balance = next(results)
+            eth_balance = format_balance(web3.from_wei(eth_balance, 'ether')) if eth_balance is not None else 'n/a'
+            response += f'\n**{alias}** `{address}`\n💰 ETH: {eth_balance}\n'
+            for token_alias, contract in tokens.items():
+                balance = next(results)
+                if not balance:
+                    continue
+                symbol = token_metadata_cache.get((contract.address, 'symbol'))
+                decimals = token_metadata_cache.get((contract.address, 'decimals'))
+                if symbol is MISSING or decimals is MISSING:
+                    symbol, decimals = token_alias, 0
+                response += f'🪙 {symbol}: {format_balance(Decimal(balance) / Decimal(10) ** decimals)}\n'
+        embed = discord.Embed(title='📊 Your portfolio', description=truncate(response, EMBED_DESCRIPTION_LIMIT))
+        embed.set_footer(text=f'Page {page + 1}/{page_count}')
+        return embed
+
+    try:
+        await send_paged(ctx, page_count, render_page)
+    except Exception as e:
+        await ctx.send(f'❌ Error getting portfolio: {str(e)}')
+        logger.error(f'Error getting portfolio: {str(e)}')
+
+@bot.command(name='cachestats', help='📈 Shows how many RPC results were served from cache.')
+async def get_cache_stats(ctx):
+    response = '📈 Cache statistics:\n\n'
+    for cache in caches:
+        total = cache.hits + cache.misses
+        hit_rate = cache.hits / total * 100 if total else 0
+        response += f'{cache.name}: {cache.hits} hits, {cache.misses} misses ({hit_rate:.1f}% hit rate), {len(cache.entries)}/{cache.maxsize} entries\n'
+    await ctx.send(response)
+
+# Record how long every command takes, and let the RPCs it makes be attributed to it
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.command_started = time.perf_counter()
+    current_command.set(ctx.command.qualified_name)
+
+@bot.after_invoke
+async def record_command_latency(ctx):
+    metrics.inc('commands_total', command=ctx.command.qualified_name)
+    metrics.observe('command_latency_seconds', time.perf_counter() - ctx.command_started, command=ctx.command.qualified_name)
+
+def collect_runtime_metrics():
+    metrics.set('uptime_seconds', round(time.time() - metrics.started_at))
+    metrics.set('notify_queue_depth', notifier.depth())
+    metrics.set('tracked_addresses', len(address_index))
+    metrics.set('watchlist_addresses', len(guild_watchlist))
+    for cache in caches:
+        metrics.set_total('cache_hits_total', cache.hits, cache=cache.name)
+        metrics.set_total('cache_misses_total', cache.misses, cache=cache.name)
+    for endpoint in rpc_pool.endpoints:
+        metrics.set_total('rpc_endpoint_requests_total', endpoint.requests, endpoint=str(endpoint))
+        metrics.set('rpc_endpoint_error_rate', endpoint.error_rate, endpoint=str(endpoint))
+        if endpoint.latency is not None:
+            metrics.set('rpc_endpoint_latency_seconds', endpoint.latency, endpoint=str(endpoint))
+
+metrics.collectors.append(collect_runtime_metrics)
+
+def format_latency(histogram):
+    def bound(value):
+        return f'>{LATENCY_BUCKETS[-1]}s' if value == math.inf else f'≤{value * 1000:g}ms'
+    return f'p50 {bound(histogram.quantile(0.5))}, p99 {bound(histogram.quantile(0.99))}'
+
+@bot.command(name='stats', help='📊 Shows watcher lag, scan times, RPC usage and command latency. Bot owner only.')
+async def get_stats(ctx):
+    if not await bot.is_owner(ctx.author):
+        await ctx.send('❌ Only the bot owner can view bot statistics.')
+        return
+
+    metrics.collect()
+    uptime = int(time.time() - metrics.started_at)
+    lines = [f'📊 Bot statistics (up {uptime // 3600}h {uptime % 3600 // 60}m):', '']
+    head = metrics.gauges.get(('watcher_head_block', ()))
+    if head is not None:
+        lines.append(f"⛓️ Watcher: head block {head}, {metrics.gauges.get(('watcher_lag_blocks', ()), 0)} blocks behind")
+    scans = metrics.histograms.get(('block_scan_seconds', ()))
+    if scans:
+        lines.append(f'🧱 Blocks scanned: {scans.count}, {format_latency(scans)}')
+    lines.append(f"📨 Notification queue: {notifier.depth()} pending, {metrics.counters.get(('notify_dropped_total', ()), 0)} dropped")
+
+    requests = metrics.series('rpc_requests_total')
+    errors = metrics.series('rpc_errors_total')
+    latencies = metrics.series('rpc_latency_seconds', 'histograms')
+    if requests:
+        lines += ['', '🌐 RPC requests:']
+        for labels, count in sorted(requests.items(), key=lambda item: -item[1]):
+            lines.append(f'`{dict(labels)["method"]}`: {count} calls, {errors.get(labels, 0)} errors, {format_latency(latencies[labels])}')
+
+    command_latencies = metrics.series('command_latency_seconds', 'histograms')
+    command_rpcs = metrics.series('command_rpc_requests_total')
+    if command_latencies:
+        lines += ['', '⌨️ Commands:']
+        for labels, histogram in sorted(command_latencies.items(), key=lambda item: -item[1].count):
+            rpcs = command_rpcs.get(labels, 0) / histogram.count
+            lines.append(f'`!{dict(labels)["command"]}`: {histogram.count} runs, {format_latency(histogram)}, {rpcs:.1f} RPCs per run')
+
+    for chunk in split_message('\n'.join(lines)):
+        await ctx.send(chunk)
+
+@bot.command(name='alertchannel', help='🔔 Sets the channel this server receives transaction alerts in. \nUsage: !alertchannel #channel')
+@commands.guild_only()
+async def set_alert_channel(ctx, channel: discord.TextChannel = None):
+    logger.info(f'set_alert_channel was called with channel: {channel}')
+    if channel is None:
+        current = ctx.guild.get_channel(alert_routes.get(ctx.guild.id, 0))
+        if current:
+            await ctx.send(f'🔔 Transaction alerts for this server go to {current.mention}.')
+        else:
+            await ctx.send(f'❗ No alert channel set. Use `!alertchannel #channel` or create a `#{DEFAULT_ALERT_CHANNEL_NAME}` channel.')
+        return
+
+    if not ctx.author.guild_permissions.manage_guild:
+        await ctx.send('❌ You need the Manage Server permission to change the alert channel.')
+        return
+
+    configured_alert_channels[ctx.guild.id] = channel.id
+    save_alert_channel(ctx.guild.id, channel.id)
+    refresh_alert_route(ctx.guild)
+    await ctx.send(f'{get_witty_response()}\n✅ Transaction alerts for this server will be sent to {channel.mention}.')
+
+async def require_manage_guild(ctx):
+    if ctx.author.guild_permissions.manage_guild:
+        return True
+    await ctx.send('❌ You need the Manage Server permission to change the watchlist.')
+    return False
+
+async def add_to_watchlist(guild_id, rows):
+    """Store an iterable of (20-byte address, label) rows for a guild and make the watcher match them."""
+    rows = iter(rows)
+    for chunk in iter(lambda: list(itertools.islice(rows, IMPORT_CHUNK_SIZE)), []):
+        save_watchlist(guild_id, chunk)
+        for key, _ in chunk:
+            guild_watchlist.add(key)
+        await asyncio.sleep(0)
+    watchlist_changed()
+
+@bot.group(name='watchlist', invoke_without_command=True, help='📋 Shows this server\'s shared watchlist, alerts for it go to the alert channel. \nUsage: !watchlist [add|remove|import|export]')
+@commands.guild_only()
+async def show_watchlist(ctx):
+    logger.info('show_watchlist was called')
+    msg = f'📋 This server watches {count_watchlist(ctx.guild.id):,} addresses.'
+    msg += f'\n💾 {len(guild_watchlist):,} addresses are watched across all servers, using {guild_watchlist.nbytes() / (1024 * 1024):.1f} MB of memory.'
+    channel = ctx.guild.get_channel(alert_routes.get(ctx.guild.id, 0))
+    if channel:
+        msg += f'\n🔔 Alerts go to {channel.mention}.'
+    else:
+        msg += f'\n❗ No alert channel set, alerts are not delivered. Use `!alertchannel #channel` or create a `#{DEFAULT_ALERT_CHANNEL_NAME}` channel.'
+    await ctx.send(msg)
+
+@show_watchlist.command(name='add', help='➕ Adds an address to this server\'s watchlist. \nUsage: !watchlist add 0xAddress [label]')
+async def watchlist_add(ctx, address: str, *, label: str = None):
+    logger.info(f'watchlist_add was called with address: {address} and label: {label}')
+    if not await require_manage_guild(ctx):
+        return
+    if not is_valid_address(address):
+        await ctx.send('❌ Invalid address. Please try again.')
+        return
+    if count_watchlist(ctx.guild.id) >= MAX_GUILD_WATCHLIST:
+        await ctx.send(f'❗ This server has reached the maximum limit of {MAX_GUILD_WATCHLIST:,} addresses.')
+        return
+    await add_to_watchlist(ctx.guild.id, [(address_key(address.lower()), label)])
+    await ctx.send(f'{get_witty_response()}\n✅ Address `{address}` added to this server\'s watchlist.')
+
+@show_watchlist.command(name='remove', help='➖ Removes an address from this server\'s watchlist. \nUsage: !watchlist remove 0xAddress')
+async def watchlist_remove(ctx, address: str):
+    logger.info(f'watchlist_remove was called with address: {address}')
+    if not await require_manage_guild(ctx):
+        return
+    if not is_valid_address(address):
+        await ctx.send('❌ Invalid address. Please try again.')
+        return
+    key = address_key(address.lower())
+    if not delete_watchlist_address(ctx.guild.id, key):
+        await ctx.send('❌ This address is not on the watchlist.')
+        return
+    # Other servers may still watch it
+    if not is_watchlisted(key):
+        guild_watchlist.discard(key)
+        watchlist_changed()
+    await ctx.send(f'✅ Address `{address}` removed from this server\'s watchlist.')
+
+@show_watchlist.command(name='import', help='📥 Adds addresses from an attached CSV file of address,label (or just address) rows. \nUsage: !watchlist import with a .csv attachment')
+async def watchlist_import(ctx):
+    logger.info('watchlist_import was called')
+    if not await require_manage_guild(ctx):
+        return
+    rows = await read_csv_attachment(ctx)
+    if rows is None:
+        return
+
+    room = MAX_GUILD_WATCHLIST - count_watchlist(ctx.guild.id)
+    imported = {}
+    skipped = 0
+    for index, row in enumerate(rows):
+        if index % IMPORT_CHUNK_SIZE == 0:
+            await asyncio.sleep(0)
+        if not is_valid_address(row[0]) or len(imported) >= room:
+            skipped += 1
+            continue
+        imported[address_key(row[0].lower())] = row[1] if len(row) > 1 and row[1] else None
+    # In address order each chunk lands on neighbouring index pages instead of rewriting pages all over the index
+    await add_to_watchlist(ctx.guild.id, ((key, imported[key]) for key in sorted(imported)))
+    logger.info(f'Guild {ctx.guild.id} imported {len(imported)} watchlist addresses, skipped {skipped}.')
+    msg = f'✅ Imported {len(imported):,} addresses into this server\'s watchlist.'
+    if skipped:
+        msg += f'\n❗ Skipped {skipped:,} rows with an invalid address or over the limit of {MAX_GUILD_WATCHLIST:,}.'
+    await ctx.send(msg)
+
+@show_watchlist.command(name='export', help='📤 Sends this server\'s watchlist as a CSV file that !watchlist import accepts.')
+async def watchlist_export(ctx):
+    logger.info('watchlist_export was called')
+    rows = [('0x' + key.hex(), label or '') for key, label in load_watchlist(ctx.guild.id)]
+    if not rows:
+        await ctx.send('❗ This server\'s watchlist is empty.')
+        return
+    await ctx.send(f'📤 {len(rows):,} watched addresses:', file=csv_file(rows, 'watchlist.csv'))
+
 @bot.command(name='get_block_details', help='Retrieve the details of a specific block in the Ethereum blockchain. \\nUsage: !get_block_details blockNumber')
 async def get_block_details(ctx, block_number: int):
     try:
-        block = web3.eth.get_block(block_number)
-        await ctx.send(f'Block details: {block}')
+        block = await web3.eth.get_block(block_number)
+        embed = discord.Embed(title=f'🧱 Block {block["number"]}', description=f'`{block["hash"].hex()}`', url=f'https://etherscan.io/block/{block["number"]}')
+        embed.add_field(name='Timestamp', value=f'<t:{block["timestamp"]}:f>')
+        embed.add_field(name='Transactions', value=str(len(block['transactions'])))
+        embed.add_field(name='Gas Used', value=f'{block["gasUsed"]:,} / {block["gasLimit"]:,}')
+        if 'baseFeePerGas' in block:
+            embed.add_field(name='Base Fee', value=f'{web3.from_wei(block["baseFeePerGas"], "gwei"):.2f} Gwei')
+        embed.add_field(name='Miner', value=f'`{block["miner"]}`', inline=False)
+        embed.add_field(name='Parent Hash', value=f'`{block["parentHash"].hex()}`', inline=False)
+        await ctx.send(embed=embed)
     except Exception as e:
         await ctx.send(f'Error getting block details: {str(e)}')
 
 @bot.command(name='gasprice', help='⛽️ Checks the current average gas price.')
 async def check_gas_price(ctx):
-    gas_price = web3.eth.gas_price
+    gas_price = await rpc_cache.get_or_fetch('gas_price', lambda: web3.eth.gas_price, GAS_PRICE_TTL)
     gwei_gas_price = web3.from_wei(gas_price, 'gwei')
     await ctx.send(f'{get_witty_response()}\n✅ Current average gas price: {gwei_gas_price} Gwei. (Source: [Etherscan](https://etherscan.io/gastracker))')
 
@@ -470,7 +2030,7 @@ async def get_transaction(ctx, alias: str, tx_hash: str):
         return
 
     try:
-        tx = web3.eth.get_transaction(tx_hash)
+        tx = await web3.eth.get_transaction(tx_hash)
     except Exception as e:
         await ctx.send(f'❌ Failed to get transaction: {str(e)}')
         return
@@ -486,67 +2046,877 @@ async def get_transaction(ctx, alias: str, tx_hash: str):
 
     await ctx.send(f'✅ {msg}')    
 
-async def watch_transactions():
+def match_transaction(tx):
+    """Return (user_id, alias, address, direction) for every subscriber of a transaction.
+
+    Guild watchlist subscribers are reported as (('guild', guild_id), label, address, direction).
+    """
+    matches = []
+    recipient = address_key(tx['to']) if tx['to'] else None
+    sender = address_key(tx['from']) if tx['from'] else None
+    for key, direction in ((recipient, "to"), (sender, "from")):
+        if key is None or (direction == "from" and key == recipient):
+            continue
+        address = '0x' + key.hex()
+        for user_id, alias in address_index.get(key, ()):
+            matches.append((user_id, alias, address, direction))
+        # The compact set only holds prefixes, SQLite has the exact addresses
+        if key in guild_watchlist:
+            for guild_id, label in load_watchlist_subscribers(key):
+                matches.append((('guild', guild_id), label or address, address, direction))
+    return matches
+
+def watching_anything():
+    return bool(address_index or guild_watchlist)
+
+def format_transaction_alert(tx, tx_hash, block_number, address, alias, direction, pending=False):
+    if pending:
+        msg = f"⏳ Pending transaction found for address `{address}` (alias: `{alias}`) in the mempool ({direction}):\n\n"
+    else:
+        msg = f"✅ Transaction found for address `{address}` (alias: `{alias}`) in block {block_number} ({direction}):\n\n"
+    msg += f"🔗 Hash: `{tx_hash}`\n"
+    msg += f"👤 From: `{tx['from']}`\n"
+    msg += f"👥 To: `{tx['to']}`\n"
+    msg += f"💰 Value: {format_balance(web3.from_wei(tx['value'], 'ether'))} ETH\n"
+    msg += f"⛽ Gas Price: {web3.from_wei(tx['gasPrice'], 'gwei')} Gwei\n"
+    msg += f"💸 Transaction Fee: {format_balance(web3.from_wei(tx['gas'] * tx['gasPrice'], 'ether'))} ETH\n"
+    msg += f"🔍 Etherscan: [View on Etherscan](https://etherscan.io/tx/{tx_hash})"
+    return msg
+
+# Alert channel routing: guild_id -> channel_id, kept up to date by guild and channel events
+DEFAULT_ALERT_CHANNEL_NAME = 'transaction-alerts'
+configured_alert_channels = load_alert_channels()
+alert_routes = {}
+
+def refresh_alert_route(guild):
+    """Resolve a guild's alert channel: the configured one, else the first named 'transaction-alerts'."""
+    channel = guild.get_channel(configured_alert_channels.get(guild.id, 0))
+    if channel is None:
+        channel = discord.utils.get(guild.text_channels, name=DEFAULT_ALERT_CHANNEL_NAME)
+    if channel is None:
+        alert_routes.pop(guild.id, None)
+    else:
+        alert_routes[guild.id] = channel.id
+
+def rebuild_alert_routes():
+    alert_routes.clear()
+    for guild in bot.guilds:
+        refresh_alert_route(guild)
+
+# User id -> ids of the guilds they are a member of, kept up to date by member and guild events
+member_guilds = {}
+
+def add_guild_members(guild):
+    for member in guild.members:
+        member_guilds.setdefault(member.id, set()).add(guild.id)
+
+def remove_guild_member(guild_id, user_id):
+    guild_ids = member_guilds.get(user_id)
+    if guild_ids is not None:
+        guild_ids.discard(guild_id)
+        if not guild_ids:
+            del member_guilds[user_id]
+
+def rebuild_member_guilds():
+    member_guilds.clear()
+    for guild in bot.guilds:
+        add_guild_members(guild)
+
+def alert_channels_for_user(user_id):
+    """Return the alert channel of every routed guild the user is a member of."""
+    return [alert_routes[guild_id] for guild_id in member_guilds.get(user_id, ()) if guild_id in alert_routes]
+
+async def rpc_batch(calls):
+    """Send (method, params) calls as one JSON-RPC batch request and return the raw results in order."""
+    payload = [{"jsonrpc": "2.0", "id": i, "method": method, "params": params} for i, (method, params) in enumerate(calls)]
+    started = time.perf_counter()
+    ok = False
+    try:
+        results = sorted(await rpc_pool.send(json.dumps(payload), cost=len(payload), pinned=rpc_pin.get()), key=lambda r: r['id'])
+        ok = True
+    finally:
+        # Batches are timed as a whole, under each method they carry
+        for method, count in Counter(method for method, _ in calls).items():
+            record_rpc(method, time.perf_counter() - started, ok, count)
+    for result in results:
+        if 'error' in result:
+            raise ValueError(result['error'])
+    return [result['result'] for result in results]
+
+async def batch_get_transactions(tx_hashes):
+    """Fetch transaction bodies with JSON-RPC batch requests of RPC_BATCH_SIZE calls each."""
+    transactions = []
+    for start in range(0, len(tx_hashes), RPC_BATCH_SIZE):
+        chunk = tx_hashes[start:start + RPC_BATCH_SIZE]
+        results = await rpc_batch([("eth_getTransactionByHash", [tx_hash.hex()]) for tx_hash in chunk])
+        for result in results:
+            if result is not None:
+                transactions.append(AttributeDict.recursive(transaction_result_formatter(result)))
+    return transactions
+
+async def fetch_block(block_identifier):
+    """Fetch a block with full transaction bodies in a single call.
+
+    Providers that cap the response size reject large full blocks, in which
+    case the transaction hashes are fetched and resolved in batches instead.
+    """
+    try:
+        return await web3.eth.get_block(block_identifier, full_transactions=True)
+    except Exception as e:
+        logger.warning(f'Full block fetch failed for {block_identifier}, falling back to batched requests: {str(e)}')
+
+    block = await web3.eth.get_block(block_identifier)
+    return AttributeDict({**block, 'transactions': await batch_get_transactions(block.transactions)})
+
+def scan_block(block):
+    """Walk a block once and collect the matches for every watching user."""
+    matches = []
+    if not watching_anything() or not block or not block.transactions:
+        return matches
+
+    for tx in block.transactions:
+        tx_hash = tx['hash'].hex()
+        for user_id, alias, address, direction in match_transaction(tx):
+            msg = format_transaction_alert(tx, tx_hash, block.number, address, alias, direction)
+            matches.append((user_id, alias, tx_hash, msg))
+    return matches
+
+def confirm_pending_matches(matches, block_number):
+    """Swap the full alert for a short confirmation where a transaction was already alerted while pending."""
+    if not pending_watchers:
+        return matches
+    confirmed = []
+    for user_id, alias, tx_hash, msg in matches:
+        alerted_pending = pending_seen.get(tx_hash)
+        if alerted_pending is not MISSING and (user_id, alias) in alerted_pending:
+            msg = f"✅ Pending transaction `{tx_hash}` (alias: `{alias}`) was confirmed in block {block_number}."
+        confirmed.append((user_id, alias, tx_hash, msg))
+    return confirmed
+
+def address_topic(key):
+    """Left-pad a 20-byte address key into a 32-byte indexed event topic."""
+    return '0x' + '00' * 12 + key.hex()
+
+def is_watched_topic(topic):
+    key = bytes.fromhex(topic[-40:])
+    return key in address_index or key in guild_watchlist
+
+async def fetch_all_transfer_logs(from_block, to_block):
+    """Fetch every Transfer log of a block range and keep those that touch a watched address.
+
+    With large watchlists a per-address topic filter costs more requests than
+    the logs themselves, so the node only filters on the event signature and
+    matching happens here, on the raw topics, before any log is formatted.
+    """
+    calls = [
+        ("eth_getLogs", [{'fromBlock': hex(start), 'toBlock': hex(min(start + UNFILTERED_LOG_BLOCKS - 1, to_block)), 'topics': [TRANSFER_TOPIC]}])
+        for start in range(from_block, to_block + 1, UNFILTERED_LOG_BLOCKS)
+    ]
+    logs = []
+    for raw_logs in await rpc_batch(calls):
+        for log in raw_logs:
+            topics = log['topics']
+            if len(topics) == 3 and (is_watched_topic(topics[1]) or is_watched_topic(topics[2])):
+                logs.append(AttributeDict.recursive(log_entry_formatter(log)))
+    return logs
+
+async def fetch_transfer_logs(from_block, to_block):
+    """Fetch the ERC-20 Transfer logs of a block range that touch a watched address.
+
+    Watched addresses are passed as indexed topics, once as the sender and once
+    as the recipient, so the node does the filtering. Past LOG_TOPIC_FILTER_MAX
+    addresses all Transfer logs are matched locally instead. Returns the logs
+    grouped by block number.
+    """
+    logs = {}
+    if len(address_index) + len(guild_watchlist) > LOG_TOPIC_FILTER_MAX:
+        for log in await fetch_all_transfer_logs(from_block, to_block):
+            logs[(log['transactionHash'], log['logIndex'])] = log
+    else:
+        # The in-memory guild watchlist only holds fingerprints, the addresses are in SQLite
+        keys = set(address_index)
+        if guild_watchlist:
+            keys.update(load_watchlist_addresses())
+        topics = [address_topic(key) for key in keys]
+        for start in range(0, len(topics), LOG_TOPIC_CHUNK_SIZE):
+            chunk = topics[start:start + LOG_TOPIC_CHUNK_SIZE]
+            for topic_filter in ([TRANSFER_TOPIC, chunk], [TRANSFER_TOPIC, None, chunk]):
+                for log in await web3.eth.get_logs({'fromBlock': from_block, 'toBlock': to_block, 'topics': topic_filter}):
+                    # A transfer between two watched addresses is returned by both queries
+                    logs[(log['transactionHash'], log['logIndex'])] = log
+
+    logs_by_block = {}
+    for log in sorted(logs.values(), key=lambda log: (log['blockNumber'], log['logIndex'])):
+        logs_by_block.setdefault(log['blockNumber'], []).append(log)
+    return logs_by_block
+
+def decode_transfer_log(log):
+    topics = log['topics']
+    # ERC-721 transfers share the signature but also index the token id
+    if len(topics) != 3:
+        return None
+    return {
+        'from': '0x' + bytes(topics[1][-20:]).hex(),
+        'to': '0x' + bytes(topics[2][-20:]).hex(),
+        'value': int.from_bytes(log['data'], 'big'),
+        'token': log['address'],
+        'hash': log['transactionHash'].hex()
+    }
+
+async def get_token_metadata(token_address):
+    contract = get_contract(token_address)
+    try:
+        fields = await get_token_fields(contract, ['symbol', 'decimals'])
+    except Exception as e:
+        # Non-standard tokens (e.g. bytes32 symbols), show raw units instead
+        logger.warning(f'Failed to get metadata for token {token_address}: {str(e)}')
+        fields = {'symbol': 'UNKNOWN', 'decimals': 0}
+        token_metadata_cache.set((contract.address, 'symbol'), fields['symbol'])
+        token_metadata_cache.set((contract.address, 'decimals'), fields['decimals'])
+    return fields['symbol'], fields['decimals']
+
+def format_token_transfer_alert(transfer, symbol, decimals, block_number, address, alias, direction):
+    amount = Decimal(transfer['value']) / Decimal(10) ** decimals
+    msg = f"🪙 Token transfer found for address `{address}` (alias: `{alias}`) in block {block_number} ({direction}):\n\n"
+    msg += f"🔗 Hash: `{transfer['hash']}`\n"
+    msg += f"🏷️ Token: {symbol} (`{transfer['token']}`)\n"
+    msg += f"👤 From: `{transfer['from']}`\n"
+    msg += f"👥 To: `{transfer['to']}`\n"
+    msg += f"💰 Amount: {format_balance(amount)} {symbol}\n"
+    msg += f"🔍 Etherscan: [View on Etherscan](https://etherscan.io/tx/{transfer['hash']})"
+    return msg
+
+def decode_transfer_logs(logs):
+    return [transfer for transfer in map(decode_transfer_log, logs) if transfer]
+
+async def get_transfers_metadata(transfers):
+    """Return token address -> (symbol, decimals) for every token in the transfers."""
+    tokens = list({transfer['token'] for transfer in transfers})
+    return dict(zip(tokens, await asyncio.gather(*(get_token_metadata(token) for token in tokens))))
+
+def match_transfers(transfers, metadata, block_number):
+    """Collect the matches for every watching user from a block's decoded transfers."""
+    matches = []
+    for transfer in transfers:
+        symbol, decimals = metadata[transfer['token']]
+        for user_id, alias, address, direction in match_transaction(transfer):
+            msg = format_token_transfer_alert(transfer, symbol, decimals, block_number, address, alias, direction)
+            matches.append((user_id, alias, transfer['hash'], msg))
+    return matches
+
+def digest_line(alert):
+    """Shorten an alert to its headline, hash and value on one line."""
+    lines = alert.splitlines()
+    details = [line for line in lines[1:] if line.startswith(('🔗 Hash:', '💰 '))]
+    return ' '.join([lines[0].rstrip(':')] + details)
+
+class Notifier:
+    """Outbound alert queues with one delivery worker per destination.
+
+    The scanner only enqueues, so a destination stuck in Discord rate-limit
+    back-off delays its own alerts and nothing else. Everything queued for a
+    destination is merged into as few messages as possible. When a queue is
+    full the oldest alerts are dropped, and a destination that falls several
+    blocks behind gets a digest instead of every full alert.
+    """
+
+    def __init__(self):
+        self.queues = {}
+        self.dropped = {}
+        self.workers = {}
+        self.send_limit = asyncio.Semaphore(NOTIFY_CONCURRENCY)
+
+    def depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def enqueue(self, destination, block_number, alerts):
+        """Queue the alerts of one block (None for pending) for a destination, ('user' | 'channel', id)."""
+        queue = self.queues.setdefault(destination, deque())
+        if len(queue) >= NOTIFY_QUEUE_SIZE:
+            _, oldest = queue.popleft()
+            self.dropped[destination] = self.dropped.get(destination, 0) + len(oldest)
+            metrics.inc('notify_dropped_total', len(oldest))
+        queue.append((block_number, alerts))
+        if destination not in self.workers:
+            self.workers[destination] = asyncio.create_task(self.deliver(destination))
+
+    def render(self, destination, pending):
+        prefix = '✉️' if destination[0] == 'user' else '🔔'
+        alerts = [alert for _, block_alerts in pending for alert in block_alerts]
+        dropped = self.dropped.pop(destination, 0)
+        # A single busy block is still sent in full, only a backlog of several is summarized
+        if not dropped and (len(pending) == 1 or len(alerts) <= NOTIFY_DIGEST_THRESHOLD):
+            return '\n\n'.join(f'{prefix} {alert}' for alert in alerts)
+
+        blocks = [block_number for block_number, _ in pending if block_number is not None]
+        block_range = f'blocks {min(blocks)}-{max(blocks)}' if blocks else 'the mempool'
+        digest = f'{prefix} 📦 Digest of {len(alerts)} alerts from {block_range}:\n\n'
+        digest += '\n'.join(digest_line(alert) for alert in alerts[:NOTIFY_DIGEST_MAX_LINES])
+        if len(alerts) > NOTIFY_DIGEST_MAX_LINES:
+            digest += f'\n...and {len(alerts) - NOTIFY_DIGEST_MAX_LINES} more.'
+        if dropped:
+            digest += f'\n⚠️ {dropped} older alerts were skipped because delivery fell behind.'
+        return digest
+
+    async def deliver(self, destination):
+        kind, target_id = destination
+        queue = self.queues[destination]
+        try:
+            while queue:
+                pending = list(queue)
+                queue.clear()
+                target = bot.get_user(target_id) if kind == 'user' else bot.get_channel(target_id)
+                if target is None:
+                    continue
+                try:
+                    async with self.send_limit:
+                        for chunk in split_message(self.render(destination, pending)):
+                            # discord.py waits out 429s per rate-limit bucket before returning
+                            await target.send(chunk)
+                except discord.HTTPException as e:
+                    logger.warning(f'Failed to deliver alerts to {kind} {target_id}: {str(e)}')
+        finally:
+            del self.workers[destination]
+            if not queue:
+                del self.queues[destination]
+
+notifier = Notifier()
+
+# Matches found while the bot is still logging in, routed by on_ready
+held_matches = []
+
+def dispatch_matches(matches, block_number):
+    """Queue the (user_id, alias, tx_hash, msg) matches of a scanned block, merged per subscriber."""
+    if not matches:
+        return
+    if not bot.is_ready():
+        # Users, channels and alert routes are unknown until the guild cache is loaded
+        held_matches.append((matches, block_number))
+        return
+
+    alerts_by_user = {}
+    alerts_by_guild = {}
+    for user_id, _, _, msg in matches:
+        if isinstance(user_id, tuple):
+            # Guild watchlist alerts only go to the guild's alert channel
+            alerts_by_guild.setdefault(user_id[1], []).append(msg)
+        else:
+            alerts_by_user.setdefault(user_id, []).append(msg)
+    for user_id, alerts in alerts_by_user.items():
+        notifier.enqueue(('user', user_id), block_number, alerts)
+
+    # Send messages to the alert channel of every guild the user is in
+    alerts_by_channel = {}
+    for user_id, alerts in alerts_by_user.items():
+        for channel_id in alert_channels_for_user(user_id):
+            alerts_by_channel.setdefault(channel_id, []).extend(alerts)
+    for guild_id, alerts in alerts_by_guild.items():
+        if guild_id in alert_routes:
+            alerts_by_channel.setdefault(alert_routes[guild_id], []).extend(alerts)
+    for channel_id, alerts in alerts_by_channel.items():
+        notifier.enqueue(('channel', channel_id), block_number, alerts)
+
+# Pending transactions already looked at, mapped to the subscribers alerted about them.
+# Bounded so a mempool flood evicts the oldest hashes instead of growing memory.
+pending_seen = Cache('pending transactions', PENDING_SEEN_SIZE)
+
+async def watch_pending_transactions():
+    """Alert opted-in subscribers about matching transactions while they are still pending."""
+    pending_filter_id = None
     while not bot.is_closed():
-        for user_id, addresses in tracked_addresses.items():
-            if not addresses:
+        await asyncio.sleep(PENDING_POLL_INTERVAL)
+        if not pending_watchers:
+            continue
+
+        try:
+            if pending_filter_id is None:
+                pending_filter_id = (await web3.eth.filter('pending')).filter_id
+            tx_hashes = await web3.eth.get_filter_changes(pending_filter_id)
+        except Exception as e:
+            # Filters expire on the node when not polled, create a new one next time
+            logger.warning(f'Pending transaction filter failed, recreating it: {str(e)}')
+            if pending_filter_id is not None:
+                try:
+                    await web3.eth.uninstall_filter(pending_filter_id)
+                except Exception:
+                    # Already gone on the node, only our record of it is dropped
+                    rpc_pool.filter_endpoints.pop(pending_filter_id, None)
+            pending_filter_id = None
+            continue
+
+        new_hashes = [tx_hash for tx_hash in tx_hashes if pending_seen.get(tx_hash.hex()) is MISSING]
+        if len(new_hashes) > PENDING_MAX_PER_POLL:
+            logger.warning(f'Mempool flood, skipping {len(new_hashes) - PENDING_MAX_PER_POLL} pending transactions.')
+            new_hashes = new_hashes[:PENDING_MAX_PER_POLL]
+        for tx_hash in new_hashes:
+            pending_seen.set(tx_hash.hex(), frozenset())
+
+        try:
+            transactions = await batch_get_transactions(new_hashes)
+        except Exception as e:
+            logger.error(f'Error getting pending transactions: {str(e)}')
+            continue
+
+        matches = []
+        for tx in transactions:
+            tx_hash = tx['hash'].hex()
+            alerted = set()
+            for user_id, alias, address, direction in match_transaction(tx):
+                if (user_id, alias) in pending_watchers:
+                    msg = format_transaction_alert(tx, tx_hash, None, address, alias, direction, pending=True)
+                    matches.append((user_id, alias, tx_hash, msg))
+                    alerted.add((user_id, alias))
+            if alerted:
+                pending_seen.set(tx_hash, frozenset(alerted))
+        dispatch_matches(matches, None)
+
+# Set whenever the newHeads subscription reports a block, waking the watcher
+new_head_event = asyncio.Event()
+new_heads_subscribed = False
+
+async def subscribe_new_heads():
+    """Wake the watcher on every newHeads notification, reconnecting when the socket drops."""
+    global new_heads_subscribed
+    delay = WS_RECONNECT_DELAY
+    while not bot.is_closed():
+        try:
+            async with AsyncWeb3.persistent_websocket(WebsocketProviderV2(infura_ws_url)) as ws_web3:
+                await ws_web3.eth.subscribe('newHeads')
+                new_heads_subscribed = True
+                delay = WS_RECONNECT_DELAY
+                logger.info('Subscribed to newHeads, blocks will be processed as they arrive.')
+                async for response in ws_web3.ws.process_subscriptions():
+                    new_head_event.set()
+            logger.warning('newHeads subscription closed by the node, falling back to polling.')
+        except Exception as e:
+            logger.warning(f'newHeads subscription dropped, falling back to polling: {str(e)}')
+
+        new_heads_subscribed = False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, WS_MAX_RECONNECT_DELAY)
+
+async def wait_for_new_head():
+    """Sleep until the next poll, or until the newHeads subscription reports a block."""
+    # With a live subscription polling is only a safety net, so it can be infrequent
+    timeout = WS_IDLE_TIMEOUT if new_heads_subscribed else POLL_INTERVAL
+    try:
+        await asyncio.wait_for(new_head_event.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    new_head_event.clear()
+
+# The result of scanning one block, the matches are (user_id, alias, tx_hash, msg) tuples
+ScannedBlock = namedtuple('ScannedBlock', 'number hash parent_hash tx_matches token_matches scan_seconds')
+
+def save_scan_profile(profiler, start, end):
+    os.makedirs(SCAN_PROFILE_DIR, exist_ok=True)
+    path = os.path.join(SCAN_PROFILE_DIR, f'scan-{start}-{end}-{os.getpid()}.prof')
+    profiler.dump_stats(path)
+    logger.info(f'Saved scan profile for blocks {start}-{end} to {path}')
+
+async def fetch_scan_batch(start, end):
+    """Fetch blocks start..end and then their Transfer logs, returning (block, logs) pairs.
+
+    Logs are queried after the blocks, so a log whose blockHash differs from
+    the fetched block means that block was replaced in the meantime. The batch
+    is then fetched again, dropping the logs would lose the replacement's
+    transfers while the parent hashes still line up.
+
+    Every call of an attempt goes to one endpoint. A lagging endpoint answers
+    eth_getLogs for blocks it hasn't synced with no logs rather than an error,
+    but one that served the blocks has their logs too.
+    """
+    behind = set()
+    for attempt in range(SCAN_REFETCH_ATTEMPTS):
+        ranked = await rpc_pool.ranked()
+        endpoint = next((endpoint for endpoint in ranked if endpoint not in behind), ranked[0])
+        pin = rpc_pin.set(endpoint)
+        try:
+            if watching_anything():
+                blocks = [await fetch_block(number) for number in range(start, end + 1)]
+                transfer_logs = await fetch_transfer_logs(start, end)
+            else:
+                # Nothing to match, only the headers are needed to move the cursor
+                blocks = [await web3.eth.get_block(number) for number in range(start, end + 1)]
+                transfer_logs = {}
+        except BlockNotFound:
+            logger.warning(f'{endpoint} has not synced blocks {start}-{end} yet, trying another endpoint.')
+            behind.add(endpoint)
+            continue
+        finally:
+            rpc_pin.reset(pin)
+        hashes = {block.number: block.hash for block in blocks}
+        if all(log['blockHash'] == hashes.get(number) for number, logs in transfer_logs.items() for log in logs):
+            return [(block, transfer_logs.get(block.number, [])) for block in blocks]
+        logger.warning(f'Blocks {start}-{end} changed while their logs were fetched, fetching them again.')
+    raise ValueError(f'Could not fetch a consistent copy of blocks {start}-{end}')
+
+async def scan_blocks_locally(start, end):
+    """Fetch and scan blocks start..end in this process, yielding a ScannedBlock for each in order."""
+    if start > end:
+        return
+    # Sampled profiling of block matching and decoding, view the saved stats with pstats or snakeviz.
+    # Only synchronous sections are profiled, across an await other coroutines would be included.
+    profiler = cProfile.Profile() if SCAN_PROFILE_RATE and random.random() < SCAN_PROFILE_RATE else None
+    profiled = profiler if profiler else contextlib.nullcontext()
+    try:
+        started = time.perf_counter()
+        # One log query covers token transfers for the whole range
+        batch = await fetch_scan_batch(start, end)
+        # The batch fetch is shared out evenly over its blocks' scan times
+        fetch_seconds = (time.perf_counter() - started) / len(batch)
+        for block, logs in batch:
+            started = time.perf_counter()
+            with profiled:
+                tx_matches, transfers = scan_block(block), decode_transfer_logs(logs)
+            metadata = await get_transfers_metadata(transfers)
+            with profiled:
+                token_matches = match_transfers(transfers, metadata, block.number)
+            scan_seconds = fetch_seconds + time.perf_counter() - started
+            yield ScannedBlock(block.number, block.hash.hex(), block.parentHash.hex(), tx_matches, token_matches, scan_seconds)
+    finally:
+        if profiler:
+            save_scan_profile(profiler, start, end)
+
+def scanner_worker(tasks, results, processes):
+    """Entry point of a scanner worker process."""
+    asyncio.run(run_scanner_worker(tasks, results, processes))
+
+async def run_scanner_worker(tasks, results, processes):
+    # Tasks are ('index', (snapshot, watchlist)) to replace the address index and guild watchlist set, or
+    # ('scan', (job_id, start, end)) to scan a block range, None stops the worker
+    global guild_watchlist
+    rpc_pool.share_rates(processes)
+    loop = asyncio.get_running_loop()
+    await get_http_session()
+    try:
+        while True:
+            task = await loop.run_in_executor(None, tasks.get)
+            if task is None:
+                break
+            kind, payload = task
+            if kind == 'index':
+                snapshot, guild_watchlist = payload
+                address_index.clear()
+                address_index.update(snapshot)
                 continue
-
-            user = bot.get_user(user_id)
-            if not user:
+            job_id, start, end = payload
+            # The worker's RPC metrics travel back with each result
+            try:
+                blocks = [scanned async for scanned in scan_blocks_locally(start, end)]
+                results.put((job_id, blocks, None, metrics.drain()))
+            except Exception as e:
+                results.put((job_id, None, str(e), metrics.drain()))
+    finally:
+        await http_session.close()
+
+class ScannerPool:
+    """Scanner worker processes, each fetching and matching the block ranges it is handed.
+
+    Every worker holds a copy of the address index and scans whole blocks, so a
+    catch-up batch is split into one contiguous range per worker and throughput
+    grows with the worker count. Results come back over a shared queue and are
+    yielded in block order, the watcher keeps the cursor, reorg buffer and
+    alert delivery in the bot process.
+    """
+
+    def __init__(self, size):
+        # Spawned rather than forked, the bot's event loop and sockets must not leak into workers
+        self.context = multiprocessing.get_context('spawn')
+        self.results = self.context.Queue()
+        self.workers = [None] * size
+        self.index_versions = [None] * size
+        self.futures = {}
+        self.job_ids = itertools.count()
+        self.reader = None
+        # Every process has its own RPC pool, the bot and each worker get an equal share of the endpoint budgets
+        rpc_pool.share_rates(size + 1)
+
+    def ensure_workers(self):
+        for shard, worker in enumerate(self.workers):
+            if worker is None or not worker[0].is_alive():
+                if worker is not None:
+                    logger.error(f'Scanner worker {shard} exited with code {worker[0].exitcode}, restarting it.')
+                tasks = self.context.Queue()
+                process = self.context.Process(target=scanner_worker, args=(tasks, self.results, len(self.workers) + 1), name=f'scanner-{shard}', daemon=True)
+                process.start()
+                self.workers[shard] = (process, tasks)
+                self.index_versions[shard] = None
+            if self.index_versions[shard] != address_index_version:
+                # Copied, the queue pickles in a background thread while the index may change
+                snapshot = {key: set(subscribers) for key, subscribers in address_index.items()}
+                self.workers[shard][1].put(('index', (snapshot, guild_watchlist.copy())))
+                self.index_versions[shard] = address_index_version
+        if self.reader is None:
+            self.reader = asyncio.create_task(self.read_results())
+
+    async def read_results(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            result = await loop.run_in_executor(None, self.results.get)
+            if result is None:
+                break
+            job_id, blocks, error, worker_metrics = result
+            metrics.merge(worker_metrics)
+            future = self.futures.pop(job_id, None)
+            if future is None or future.done():
                 continue
+            if error is not None:
+                future.set_exception(ValueError(error))
+            else:
+                future.set_result(blocks)
+
+    async def scan_blocks(self, start, end):
+        """Scan blocks start..end across the workers, yielding a ScannedBlock for each in order."""
+        self.ensure_workers()
+        count = end - start + 1
+        if count <= 0:
+            return
+        shard_size = -(-count // len(self.workers))
+        jobs = []
+        for shard, shard_start in enumerate(range(start, end + 1, shard_size)):
+            job_id = next(self.job_ids)
+            future = self.futures[job_id] = asyncio.get_running_loop().create_future()
+            self.workers[shard][1].put(('scan', (job_id, shard_start, min(end, shard_start + shard_size - 1))))
+            jobs.append((job_id, future))
+        try:
+            for _, future in jobs:
+                for scanned in await asyncio.wait_for(future, SCANNER_TIMEOUT):
+                    yield scanned
+        finally:
+            for job_id, _ in jobs:
+                self.futures.pop(job_id, None)
+
+    def stop(self):
+        for worker in self.workers:
+            if worker is not None:
+                worker[1].put(None)
+        self.results.put(None)
+        for worker in self.workers:
+            if worker is not None:
+                worker[0].join(timeout=5)
+
+# A scanned block in the reorg ring buffer, alerts holds the (user_id, alias, tx_hash)
+# alerted in it until they are confirmed or reorged out
+BlockHeader = namedtuple('BlockHeader', 'number hash parent_hash alerts')
+
+async def roll_back_reorg(headers):
+    """Pop headers that are no longer canonical off the ring buffer and return them, newest first."""
+    orphaned = []
+    while headers:
+        canonical = await web3.eth.get_block(headers[-1].number)
+        if canonical.hash.hex() == headers[-1].hash:
+            break
+        orphaned.append(headers.pop())
+    return orphaned
+
+def send_reorg_alerts(orphaned):
+    for header in orphaned:
+        follow_ups = [
+            (user_id, alias, tx_hash, f"⚠️ Transaction `{tx_hash}` (alias: `{alias}`) in block {header.number} was reorged out of the chain. It may reappear in a replacement block.")
+            for user_id, alias, tx_hash in header.alerts
+        ]
+        dispatch_matches(follow_ups, header.number)
+
+def send_confirmation_alerts(headers, head_number):
+    """Confirm the alerts of the block that just reached CONFIRMATION_BLOCKS depth."""
+    for header in headers:
+        if header.number == head_number - CONFIRMATION_BLOCKS and header.alerts:
+            follow_ups = [
+                (user_id, alias, tx_hash, f"🔒 Transaction `{tx_hash}` (alias: `{alias}`) in block {header.number} is confirmed after {CONFIRMATION_BLOCKS} blocks.")
+                for user_id, alias, tx_hash in header.alerts
+            ]
+            dispatch_matches(follow_ups, header.number)
+            header.alerts.clear()
 
-            block = web3.eth.get_block('latest')
-            if block and block.transactions:
-                for transaction in block.transactions:
-                    tx_hash = transaction.hex()
-                    tx = web3.eth.get_transaction(tx_hash)
-                    if tx.to is not None:
-                        for alias, address in addresses.items():
-                            if tx.to.lower() == address or tx['from'].lower() == address:
-                                direction = "to" if tx.to.lower() == address else "from"
-                                msg = f"✅ Transaction found for address `{address}` (alias: `{alias}`) in block {block.number} ({direction}):\n\n"
-                                msg += f"🔗 Hash: `{tx_hash}`\n"
-                                msg += f"👤 From: `{tx['from']}`\n"
-                                msg += f"👥 To: `{tx['to']}`\n"
-                                msg += f"💰 Value: {format_balance(web3.from_wei(tx['value'], 'ether'))} ETH\n"
-                                msg += f"⛽ Gas Price: {web3.from_wei(tx['gasPrice'], 'gwei')} Gwei\n"
-                                msg += f"💸 Transaction Fee: {format_balance(web3.from_wei(tx['gas'] * tx['gasPrice'], 'ether'))} ETH\n"
-                                msg += f"🔍 Etherscan: [View on Etherscan](https://etherscan.io/tx/{tx_hash})"
-
-                                await user.send(f'✉️ {msg}')
-                                # Send message to the 'transaction-alerts' channel
-                                transaction_alerts_channel = None
-                                for guild in bot.guilds:
-                                    for channel in guild.text_channels:
-                                        if channel.name == "transaction-alerts":
-                                            transaction_alerts_channel = channel
-                                            break
-                                    if transaction_alerts_channel:
-                                        break
-
-                                if transaction_alerts_channel:
-                                    await transaction_alerts_channel.send(f'🔔 {msg}')
-
-        await asyncio.sleep(5)
+async def watch_transactions():
+    # Walk every block from the persisted cursor to head, in order, so that
+    # slow scans and restarts never skip a block
+    scan_blocks = scan_blocks_locally
+    scanner_pool = None
+    if SCANNER_WORKERS > 0:
+        scanner_pool = ScannerPool(SCANNER_WORKERS)
+        scan_blocks = scanner_pool.scan_blocks
+        logger.info(f'Scanning blocks with {SCANNER_WORKERS} worker processes.')
+    try:
+        await follow_chain(scan_blocks)
+    finally:
+        if scanner_pool:
+            scanner_pool.stop()
+
+async def follow_chain(scan_blocks):
+    cursor, cursor_hash = load_cursor()
+    # Fixed-size ring buffer of recent headers, used to detect reorgs and skip duplicates
+    headers = deque(maxlen=HEADER_BUFFER_SIZE)
+    if cursor_hash is not None:
+        headers.append(BlockHeader(cursor, cursor_hash, None, []))
+    while not bot.is_closed():
+        try:
+            head = await web3.eth.block_number
+            if cursor is None:
+                cursor = head - 1
+                logger.info(f'No watcher cursor found, starting from block {head}.')
+            metrics.set('watcher_head_block', head)
+            metrics.set('watcher_lag_blocks', head - cursor)
+
+            # Catch up in bounded batches so a long downtime doesn't stall the loop,
+            # with a batch's worth of blocks for every scanner worker
+            end = min(head, cursor + CATCHUP_BATCH_SIZE * max(SCANNER_WORKERS, 1))
+            async for scanned in scan_blocks(cursor + 1, end):
+                number, block_hash = scanned.number, scanned.hash
+
+                if headers and headers[-1].number == number - 1 and headers[-1].hash != scanned.parent_hash:
+                    orphaned = await roll_back_reorg(headers)
+                    logger.warning(f'Reorg detected at block {number}, rolling back {len(orphaned)} blocks.')
+                    send_reorg_alerts(orphaned)
+                    if headers:
+                        cursor = headers[-1].number
+                        save_cursor(cursor, headers[-1].hash)
+                    else:
+                        # Deeper than the ring buffer, rescan from just before the oldest orphaned block
+                        logger.error(f'Reorg deeper than {HEADER_BUFFER_SIZE} blocks, rescanning from block {orphaned[-1].number}.')
+                        cursor = orphaned[-1].number - 1
+                    # Rescan the replacement blocks on the next pass
+                    break
+
+                if any(header.number == number and header.hash == block_hash for header in headers):
+                    # Already processed, e.g. the same block returned twice
+                    cursor = number
+                    continue
+
+                matches = confirm_pending_matches(scanned.tx_matches, number) + scanned.token_matches
+                dispatch_matches(matches, number)
+                metrics.observe('block_scan_seconds', scanned.scan_seconds)
+                metrics.inc('blocks_scanned_total')
+                metrics.inc('alerts_total', len(matches))
+                headers.append(BlockHeader(number, block_hash, scanned.parent_hash, list(dict.fromkeys(match[:3] for match in matches))))
+                send_confirmation_alerts(headers, number)
+
+                cursor = number
+                save_cursor(cursor, block_hash)
+                metrics.set('watcher_cursor_block', cursor)
+                metrics.set('watcher_lag_blocks', head - cursor)
+        except Exception as e:
+            logger.error(f'Error while watching transactions: {str(e)}')
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+
+        if cursor < head:
+            # Still behind head, keep going without waiting for the next poll
+            await asyncio.sleep(0)
+        else:
+            await wait_for_new_head()
 
 @bot.event
 async def on_ready():
+    # Fires again after every reconnect, everything here must be safe to repeat
     print(f'Ready! Logged in as {bot.user.name}#{bot.user.discriminator}')
-    bot.loop.create_task(watch_transactions())
-    for guild in bot.guilds:
-        for channel in guild.text_channels:
-            if channel.permissions_for(guild.me).send_messages:
-                greeting_message = f"```🤖👀\nBot connected and ready!\nBot tag: {bot.user.name}#{bot.user.discriminator}```\n```Use !help for a list of commands```"
-                await channel.send(greeting_message)
-                break
+    rebuild_alert_routes()
+    rebuild_member_guilds()
+    start_background_tasks()
+    held = held_matches[:]
+    held_matches.clear()
+    for matches, block_number in held:
+        dispatch_matches(matches, block_number)
+    if SEND_GREETINGS and 'greetings' not in background_tasks:
+        background_tasks['greetings'] = asyncio.create_task(send_greetings())
+
+# Long-running loops by name, at most one task each however often on_ready fires
+background_tasks = {}
+
+def start_background_tasks():
+    """Start the watcher loops that are not running yet.
+
+    Called before login so that catching up on missed blocks overlaps the
+    Discord handshake, and again from on_ready to revive a loop that died.
+    """
+    loops = {'watcher': watch_transactions, 'pending': watch_pending_transactions}
+    if infura_ws_url:
+        loops['new_heads'] = subscribe_new_heads
+    for name, loop in loops.items():
+        task = background_tasks.get(name)
+        if task is not None and not task.done():
+            continue
+        if task is not None and not task.cancelled() and task.exception():
+            logger.error(f'Background task {name} failed, restarting it: {str(task.exception())}')
+        background_tasks[name] = asyncio.create_task(loop(), name=name)
+
+async def greet_guild(guild, limit):
+    for channel in guild.text_channels:
+        if channel.permissions_for(guild.me).send_messages:
+            greeting_message = f"```🤖👀\nBot connected and ready!\nBot tag: {bot.user.name}#{bot.user.discriminator}```\n```Use !help for a list of commands```"
+            try:
+                async with limit:
+                    await channel.send(greeting_message)
+            except discord.HTTPException as e:
+                logger.warning(f'Failed to greet guild {guild.id}: {str(e)}')
+            return
+
+async def send_greetings():
+    """Greet every guild, GREETING_CONCURRENCY at a time, without holding up on_ready."""
+    limit = asyncio.Semaphore(GREETING_CONCURRENCY)
+    await asyncio.gather(*(greet_guild(guild, limit) for guild in bot.guilds))
+
+# Keep the alert routing table and guild memberships in sync with guild, member and channel changes
+@bot.event
+async def on_guild_join(guild):
+    refresh_alert_route(guild)
+    add_guild_members(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    alert_routes.pop(guild.id, None)
+    for member in guild.members:
+        remove_guild_member(guild.id, member.id)
+
+@bot.event
+async def on_member_join(member):
+    member_guilds.setdefault(member.id, set()).add(member.guild.id)
+
+@bot.event
+async def on_member_remove(member):
+    remove_guild_member(member.guild.id, member.id)
+
+@bot.event
+async def on_guild_channel_create(channel):
+    refresh_alert_route(channel.guild)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    refresh_alert_route(channel.guild)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    if before.name != after.name:
+        refresh_alert_route(after.guild)
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def start_metrics_server():
+    """Serve the metrics for Prometheus to scrape at http://METRICS_HOST:METRICS_PORT/metrics."""
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, int(METRICS_PORT)).start()
+    logger.info(f'Serving metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics')
+    return runner
 
 async def main():
+    await get_http_session()
+    metrics_runner = await start_metrics_server() if METRICS_PORT else None
+    # Scanning needs no Discord connection, alerts found during login wait for on_ready
+    start_background_tasks()
     try:
         await bot.start(DISCORD_BOT_TOKEN)
     except KeyboardInterrupt:
         await bot.logout()
         await bot.close()
+    finally:
+        await http_session.close()
+        if metrics_runner:
+            await metrics_runner.cleanup()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file